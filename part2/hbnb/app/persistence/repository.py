@@ -25,12 +25,63 @@ class Repository(ABC):
     def get_by_attribute(self, attr_name, attr_value):
         pass
 
+    @abstractmethod
+    def find_all_by_attribute(self, attr_name, attr_value):
+        pass
+
 
 class InMemoryRepository(Repository):
-    def __init__(self):
+    def __init__(self, indexes=(), unique_indexes=()):
+        """indexes / unique_indexes name the attributes to keep a hash index on"""
         self._storage = {}
+        self._unique = {attr: {} for attr in unique_indexes}
+        self._indexes = {attr: {} for attr in indexes}
+        self._indexed_values = {}
+
+    def _index(self, obj):
+        """Register obj in the secondary indexes, refusing duplicate unique values"""
+        values = {attr: getattr(obj, attr, None) for attr in (*self._unique, *self._indexes)}
+        for attr, index in self._unique.items():
+            owner = index.get(values[attr])
+            if values[attr] is not None and owner is not None and owner != obj.id:
+                raise ValueError(f"{attr} '{values[attr]}' already exists")
+        self._index_values(obj.id, values)
+
+    def _index_values(self, obj_id, values):
+        for attr, index in self._unique.items():
+            if values[attr] is not None:
+                index[values[attr]] = obj_id
+        for attr, index in self._indexes.items():
+            index.setdefault(values[attr], set()).add(obj_id)
+        self._indexed_values[obj_id] = values
+
+    def _unindex(self, obj_id):
+        """Drop obj_id from the indexes, using the values it was indexed under"""
+        values = self._indexed_values.pop(obj_id, None)
+        if values is None:
+            return None
+        for attr, index in self._unique.items():
+            if index.get(values[attr]) == obj_id:
+                del index[values[attr]]
+        for attr, index in self._indexes.items():
+            ids = index.get(values[attr])
+            if ids is not None:
+                ids.discard(obj_id)
+                if not ids:
+                    del index[values[attr]]
+        return values
+
+    def _reindex(self, obj, previous):
+        """Index obj again, putting back the previous entries if that fails"""
+        try:
+            self._index(obj)
+        except ValueError:
+            if previous is not None:
+                self._index_values(obj.id, previous)
+            raise
 
     def add(self, obj):
+        self._reindex(obj, self._unindex(obj.id))
         self._storage[obj.id] = obj
 
     def get(self, obj_id):
@@ -42,11 +93,36 @@ class InMemoryRepository(Repository):
     def update(self, obj_id, data):
         obj = self.get(obj_id)
         if obj:
-            obj.update(data)
+            previous = self._unindex(obj_id)
+            try:
+                obj.update(data)
+                self._index(obj)
+            except Exception:
+                # Whatever failed, obj keeps its indexed values and its index entries
+                for attr, value in (previous or {}).items():
+                    if getattr(obj, attr, None) != value:
+                        setattr(obj, attr, value)
+                if previous is not None:
+                    self._index_values(obj_id, previous)
+                raise
 
     def delete(self, obj_id):
         if obj_id in self._storage:
+            self._unindex(obj_id)
             del self._storage[obj_id]
 
     def get_by_attribute(self, attr_name, attr_value):
-        return next((obj for obj in self._storage.values() if getattr(obj, attr_name) == attr_value), None)
\ No newline at end of file
+        if attr_name in self._unique:
+            return self._storage.get(self._unique[attr_name].get(attr_value))
+        if attr_name in self._indexes:
+            ids = self._indexes[attr_name].get(attr_value)
+            return self._storage[next(iter(ids))] if ids else None
+        return next((obj for obj in self._storage.values() if getattr(obj, attr_name) == attr_value), None)
+
+    def find_all_by_attribute(self, attr_name, attr_value):
+        if attr_name in self._unique:
+            obj = self.get_by_attribute(attr_name, attr_value)
+            return [obj] if obj else []
+        if attr_name in self._indexes:
+            return [self._storage[obj_id] for obj_id in self._indexes[attr_name].get(attr_value, ())]
+        return [obj for obj in self._storage.values() if getattr(obj, attr_name) == attr_value]
\ No newline at end of file
@@ -6,9 +6,9 @@ from app.models.review import Review
 
 class HBnBFacade:
     def __init__(self):
-        self.user_repo = InMemoryRepository()
-        self.place_repo = InMemoryRepository()
-        self.review_repo = InMemoryRepository()
+        self.user_repo = InMemoryRepository(unique_indexes=('email',))
+        self.place_repo = InMemoryRepository(indexes=('owner_id',))
+        self.review_repo = InMemoryRepository(indexes=('place_id', 'user_id'))
         self.amenity_repo = InMemoryRepository()
         
     def create_user(self, user_data):
@@ -214,7 +214,7 @@ class HBnBFacade:
         return self.review_repo.get_all()
 
     def get_reviews_by_place(self, place_id):
-        return [r for r in self.review_repo.get_all() if r.place_id == place_id]
+        return self.review_repo.find_all_by_attribute('place_id', place_id)
 
     def update_review(self, review_id, review_data):
         review = self.review_repo.get(review_id)
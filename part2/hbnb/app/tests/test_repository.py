@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+from app.models.user import User
+from app.persistence.repository import InMemoryRepository
+
+def test_repository_indexes():
+    repo = InMemoryRepository(indexes=('last_name',), unique_indexes=('email',))
+    john = User(first_name="John", last_name="Doe", email="john.doe@example.com")
+    jane = User(first_name="Jane", last_name="Doe", email="jane.doe@example.com")
+    repo.add(john)
+    repo.add(jane)
+
+    assert repo.get_by_attribute('email', "jane.doe@example.com") is jane
+    assert len(repo.find_all_by_attribute('last_name', "Doe")) == 2
+
+    # Unique index refuses a second user with the same email
+    try:
+        repo.add(User(first_name="Jim", last_name="Roe", email="john.doe@example.com"))
+        assert False, "duplicate email accepted"
+    except ValueError:
+        pass
+
+    # Indexes follow updates and deletes
+    repo.update(john.id, {'email': "john@example.com"})
+    assert repo.get_by_attribute('email', "john.doe@example.com") is None
+    assert repo.get_by_attribute('email', "john@example.com") is john
+    repo.delete(jane.id)
+    assert repo.find_all_by_attribute('last_name', "Doe") == [john]
+    print("Repository index test passed!")
+
+test_repository_indexes()
+
+def test_failed_update_keeps_indexes():
+    repo = InMemoryRepository(indexes=('last_name',), unique_indexes=('email',))
+    john = User(first_name="John", last_name="Doe", email="john.doe@example.com")
+    repo.add(john)
+
+    # The model rejects the update: john stays indexed under his current values
+    for data in ({'email': "bad"}, john):
+        try:
+            repo.update(john.id, data)
+            assert False, "invalid update accepted"
+        except (ValueError, TypeError):
+            pass
+        assert john.email == "john.doe@example.com"
+        assert repo.get_by_attribute('email', "john.doe@example.com") is john
+        assert repo.find_all_by_attribute('last_name', "Doe") == [john]
+    try:
+        repo.add(User(first_name="Jim", last_name="Roe", email="john.doe@example.com"))
+        assert False, "duplicate email accepted"
+    except ValueError:
+        pass
+    print("Repository failed update test passed!")
+
+test_failed_update_keeps_indexes()
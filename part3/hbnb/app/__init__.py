@@ -1,12 +1,7 @@
 from flask import Flask
 from flask_restx import Api
-from app.api.v1.users import api as users_ns
-from app.api.v1.amenities import api as amenities_ns
-from app.api.v1.places import api as places_ns 
-from app.api.v1.reviews import api as reviews_ns
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
-from app.api.v1.auth import api as auth_ns
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
@@ -14,19 +9,28 @@ bcrypt = Bcrypt()
 jwt = JWTManager()
 
 
-
 def create_app(config_class="config.DevelopmentConfig"):
+    # The namespaces import the facade, which imports the models, which need db: import them once db exists
+    from app.api.v1.users import api as users_ns
+    from app.api.v1.amenities import api as amenities_ns
+    from app.api.v1.places import api as places_ns
+    from app.api.v1.reviews import api as reviews_ns
+    from app.api.v1.auth import api as auth_ns
+
     app = Flask(__name__)
     api = Api(app, version='1.0', title='HBnB API', description='HBnB Application API')
-    
-    
-    
+
+    # Fast JSON encoding (orjson when installed), datetimes and UUIDs included
+    from app.api.representations import init_api
+    init_api(api)
+
+    # The configuration must be loaded before the extensions are initialised
+    app.config.from_object(config_class)
+
     bcrypt.init_app(app)
     jwt.init_app(app)
     db.init_app(app)
 
-    app.config.from_object(config_class)
-
 
     # Register the users namespace
     api.add_namespace(users_ns, path='/api/v1/users')
@@ -36,4 +40,19 @@ def create_app(config_class="config.DevelopmentConfig"):
     api.add_namespace(reviews_ns, path='/api/v1/reviews')
     api.add_namespace(auth_ns, path='/api/v1/auth')
 
+    # The facade's read memo only lives as long as a request
+    from app.services import facade
+    app.teardown_request(facade.clear_request_memo)
+    facade.init_app(app)
+
+    from app.services.response_cache import response_cache
+    response_cache.init_app(app)
+
+    # gzip/brotli response compression, negotiated with Accept-Encoding
+    if app.config.get('COMPRESS_LEVEL', 6):
+        from app.middleware import CompressionMiddleware
+        app.wsgi_app = CompressionMiddleware(app.wsgi_app, level=app.config.get('COMPRESS_LEVEL', 6),
+                                             min_size=app.config.get('COMPRESS_MIN_SIZE', 500),
+                                             brotli_quality=app.config.get('COMPRESS_BROTLI_QUALITY', 4))
+
     return app
\ No newline at end of file
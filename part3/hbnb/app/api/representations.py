@@ -0,0 +1,61 @@
+"""JSON representation of the API responses.
+
+orjson encodes dicts, datetimes and UUIDs natively, several times faster than
+the stdlib json used by flask_restx. It stays optional: without it (or when
+RESTX_JSON asks for custom json settings) the stdlib encoder is used, with a
+default that handles the same types.
+"""
+import datetime
+import decimal
+import json
+import uuid
+
+from flask import current_app, make_response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def default(obj):
+    """Encode what json does not know about; orjson only calls it for Decimal"""
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data, indent=False):
+    """JSON text of data, ending with a newline like flask_restx's output"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=default, option=option)
+    return json.dumps(data, default=default, indent=4 if indent else None) + "\n"
+
+
+def output_json(data, code, headers=None):
+    """Makes a Flask response with a JSON encoded body"""
+    settings = current_app.config.get('RESTX_JSON')
+    if settings:
+        # Custom encoder settings are json.dumps arguments: honour them with the stdlib
+        settings = dict(settings)
+        if current_app.debug:
+            settings.setdefault('indent', 4)
+        settings.setdefault('default', default)
+        dumped = json.dumps(data, **settings) + "\n"
+    else:
+        dumped = dumps(data, indent=current_app.debug)
+    response = make_response(dumped, code)
+    response.headers.extend(headers or {})
+    return response
+
+
+def init_api(api):
+    """Serve application/json through output_json"""
+    api.representation('application/json')(output_json)
@@ -2,6 +2,9 @@
 from flask_restx import Namespace, Resource, fields
 from flask import request
 from app.services import facade
+from app.api.v1.pagination import page_args, next_link
+from app.api.v1.etag import collection_etag, is_fresh, not_modified, without_version
+from app.services.response_cache import response_cache
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 api = Namespace('amenities', description='Amenity operations')
@@ -17,6 +20,11 @@ amenity_response_model = api.model('AmenityResponse', {
     'name': fields.String(required=True, description='Name of the amenity')
 })
 
+# Columns rendered by the list view, fetched as plain rows
+AMENITY_LIST_COLUMNS = ('id', 'name')
+# Plus updated_at, which only feeds the ETag of the page
+AMENITY_PAGE_COLUMNS = AMENITY_LIST_COLUMNS + ('updated_at',)
+
 @api.route('/')
 class AmenityList(Resource):
     @api.expect(amenity_model)
@@ -49,23 +57,24 @@ class AmenityList(Resource):
         except Exception as e:
             return {'error': 'An error occurred while creating the amenity'}, 400
 
+    @api.doc(params={'limit': 'Page size (max 100)', 'cursor': 'Cursor returned in the Link header'})
     @api.response(200, 'List of amenities retrieved successfully', [amenity_response_model])
+    @api.response(400, 'Invalid pagination parameters')
+    @response_cache.cached(ttl=300, tags=lambda: ['amenities'])
     def get(self):
-        """Retrieve a list of all amenities"""
+        """Retrieve a page of amenities, the next page is linked in the Link header"""
         try:
-            # Get all amenities using facade
-            amenities = facade.get_all_amenities()
-            
-            # Format response
-            amenity_list = []
-            for amenity in amenities:
-                amenity_list.append({
-                    'id': amenity.id,
-                    'name': amenity.name
-                })
+            # Get one page of amenities using facade
+            limit, cursor = page_args()
+            amenities, next_cursor = facade.get_amenities_page(limit, cursor, columns=AMENITY_PAGE_COLUMNS)
+            etag = collection_etag(amenities, next_cursor)
+            if is_fresh(etag):
+                return not_modified(etag)
             
-            return amenity_list, 200
+            return without_version(amenities), 200, dict(next_link(next_cursor), ETag=etag)
             
+        except ValueError as e:
+            return {'error': str(e)}, 400
         except Exception as e:
             return {'error': 'An error occurred while retrieving amenities'}, 500
 
@@ -0,0 +1,36 @@
+"""Strong ETags built from ids and updated_at, checked against If-None-Match.
+
+The tag is computed from the version of the rows a response is made of, never
+from the serialized body, so a matching request is answered 304 before the
+body (or the object graph behind it) is built.
+"""
+import hashlib
+
+from flask import request
+
+
+def make_etag(*parts):
+    """Strong ETag (quoted) of the given version parts"""
+    digest = hashlib.blake2b('|'.join(map(str, parts)).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def collection_etag(rows, *parts):
+    """ETag of a page of rows (dicts holding 'id' and 'updated_at') plus extra parts such as the next cursor"""
+    return make_etag(*parts, *(f"{row['id']}@{row['updated_at']}" for row in rows))
+
+
+def without_version(rows):
+    """The rows minus the 'updated_at' column fetched only for the ETag"""
+    return [{key: value for key, value in row.items() if key != 'updated_at'} for row in rows]
+
+
+def is_fresh(etag):
+    """True when the client's If-None-Match already holds etag"""
+    # Weak comparison, as RFC 9110 asks for If-None-Match; '*' matches anything
+    return bool(etag) and request.if_none_match.contains_weak(etag.strip('"'))
+
+
+def not_modified(etag):
+    """Body-less 304 carrying the ETag again"""
+    return '', 304, {'ETag': etag}
@@ -0,0 +1,22 @@
+from flask import request
+
+
+def csv_arg(name):
+    """Comma separated values of the query string, empty when absent"""
+    return [value.strip() for value in request.args.get(name, '').split(',') if value.strip()]
+
+
+def fieldset_args(default_fields, default_include=()):
+    """Read ?fields= and ?include= from the query string.
+
+    Without either, the endpoint's usual shape. With one of them, the listed
+    fields (default_fields when only include is given) and exactly the listed relations.
+    """
+    if 'fields' not in request.args and 'include' not in request.args:
+        return list(default_fields), list(default_include)
+    return csv_arg('fields') or list(default_fields), csv_arg('include')
+
+
+def include_tags(tags):
+    """Response cache tags of the relations in ?include=, tags mapping relation -> tag"""
+    return [tags[name] for name in csv_arg('include') if name in tags]
@@ -0,0 +1,25 @@
+from urllib.parse import urlencode
+from flask import request
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def page_args():
+    """Read ?limit= and ?cursor= from the query string"""
+    try:
+        limit = int(request.args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("limit must be a positive integer")
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, MAX_LIMIT), request.args.get('cursor')
+
+
+def next_link(next_cursor):
+    """Link header pointing at the next page, empty on the last page"""
+    if not next_cursor:
+        return {}
+    args = request.args.to_dict()
+    args['cursor'] = next_cursor
+    return {'Link': f'<{request.base_url}?{urlencode(args)}>; rel="next"'}
@@ -1,6 +1,11 @@
+import math
 from flask_restx import Namespace, Resource, fields
 from flask import request
 from app.services import facade
+from app.api.v1.pagination import page_args, next_link
+from app.api.v1.etag import collection_etag, is_fresh, make_etag, not_modified
+from app.api.v1.fieldsets import fieldset_args, include_tags
+from app.services.response_cache import response_cache
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 api = Namespace('places', description='Place operations')
@@ -44,7 +49,13 @@ place_list_model = api.model('PlaceListItem', {
     'id': fields.String(required=True, description='Place ID'),
     'title': fields.String(required=True, description='Title of the place'),
     'latitude': fields.Float(required=True, description='Latitude of the place'),
-    'longitude': fields.Float(required=True, description='Longitude of the place')
+    'longitude': fields.Float(required=True, description='Longitude of the place'),
+    'review_count': fields.Integer(description='Number of reviews'),
+    'rating_avg': fields.Float(description='Average rating, 0 without reviews')
+})
+
+place_search_model = api.inherit('PlaceSearchItem', place_list_model, {
+    'distance_km': fields.Float(description='Distance from the search center in kilometres')
 })
 
 place_detail_model = api.model('PlaceDetail', {
@@ -76,6 +87,27 @@ place_full_model = api.model('PlaceFull', {
     'reviews': fields.List(fields.Nested(review_model), description='List of reviews')
     })
 
+# Columns rendered by the list view, fetched as plain rows
+PLACE_LIST_COLUMNS = ('id', 'title', 'latitude', 'longitude', 'review_count', 'rating_avg')
+# Usual shape of the detail view, ?fields= and ?include= narrow or widen them
+PLACE_DETAIL_FIELDS = ('id', 'title', 'description', 'latitude', 'longitude')
+PLACE_DETAIL_INCLUDE = ('owner', 'amenities')
+MAX_REVIEWS = 20
+# Response cache tag of each relation that can be included
+RELATION_TAGS = {'owner': 'users', 'amenities': 'amenities'}
+
+def number_arg(name, default=None):
+    """A finite number from the query string, default when absent"""
+    if name not in request.args:
+        return default
+    try:
+        value = float(request.args[name])
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a number")
+    return value
+
 @api.route('/')
 class PlaceList(Resource):
     @api.expect(place_model)
@@ -109,73 +141,185 @@ class PlaceList(Resource):
         except Exception as e:
             return {'error': 'An error occurred while creating the place'}, 400
 
+    @api.doc(params={'limit': 'Page size (max 100)', 'cursor': 'Cursor returned in the Link header',
+                     'min_price': 'Lowest price per night', 'max_price': 'Highest price per night',
+                     'min_rating': 'Lowest average rating', 'sort': "'rating' for best rated first",
+                     'fields': 'Comma separated fields to return, e.g. id,title,price',
+                     'include': 'Comma separated relations to embed: owner, amenities'})
     @api.response(200, 'List of places retrieved successfully', [place_list_model])
+    @api.response(400, 'Invalid pagination parameters')
+    @response_cache.cached(ttl=30, tags=lambda: ['places', *include_tags(RELATION_TAGS)])
     def get(self):
-        """Retrieve a list of all places"""
+        """Retrieve a page of places, the next page is linked in the Link header"""
         try:
-            # Get all places using facade
-            places = facade.get_all_places()
-            
-            # Format response - only basic info for list view
-            place_list = []
-            for place in places:
-                place_list.append({
-                    'id': place.id,
-                    'title': place.title,
-                    'latitude': place.latitude,
-                    'longitude': place.longitude
-                })
+            # Get one page of places using facade
+            limit, cursor = page_args()
+            fields, include = fieldset_args(PLACE_LIST_COLUMNS)
+            columns = facade.place_columns(fields, include)
+            min_price = number_arg('min_price')
+            max_price = number_arg('max_price')
+            min_rating = number_arg('min_rating')
+            sort = request.args.get('sort')
+            if sort not in (None, 'rating'):
+                raise ValueError("sort must be 'rating'")
+            if min_rating is not None or sort == 'rating':
+                if min_price is not None or max_price is not None:
+                    raise ValueError("Rating and price filters cannot be combined")
+                # Rating filtered listings come back best rated first
+                places, next_cursor = facade.get_places_by_rating(min_rating, limit, cursor, columns=columns)
+            elif min_price is not None or max_price is not None:
+                # Price filtered listings come back cheapest first
+                places, next_cursor = facade.get_places_by_price(min_price, max_price, limit, cursor,
+                                                                 columns=columns)
+            else:
+                places, next_cursor = facade.get_places_page(limit, cursor, columns=columns)
+
+            # Only the requested fields, relations batch loaded for the whole page
+            items, versions = facade.expand_places(places, fields, include)
+            etag = collection_etag(places, next_cursor, ','.join(fields), ','.join(include), *versions)
+            if is_fresh(etag):
+                return not_modified(etag)
             
-            return place_list, 200
+            return items, 200, dict(next_link(next_cursor), ETag=etag)
             
+        except ValueError as e:
+            return {'error': str(e)}, 400
         except Exception as e:
             return {'error': 'An error occurred while retrieving places'}, 500
 
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 500
+
+def parse_coordinates(name, count):
+    """Read a comma separated list of count numbers from the query string"""
+    try:
+        values = [float(value) for value in request.args[name].split(',')]
+    except ValueError:
+        raise ValueError(f"{name} must be numbers separated by commas")
+    if len(values) != count:
+        raise ValueError(f"{name} takes {count} numbers")
+    return values
+
+def check_point(latitude, longitude):
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("Coordinates out of range")
+
+@api.route('/search')
+class PlaceSearch(Resource):
+    @api.doc(params={'q': 'Words to look for in titles and descriptions',
+                     'cursor': 'Cursor returned in the Link header (with q)',
+                     'bbox': 'Bounding box: min_lon,min_lat,max_lon,max_lat',
+                     'near': 'Center point: lat,lon', 'radius_km': 'Radius around near (default 10, max 500)',
+                     'limit': 'Number of places (max 100)'})
+    @api.response(200, 'Places found, best match or closest first', [place_search_model])
+    @api.response(400, 'Invalid search parameters')
+    def get(self):
+        """Search places by keywords, or in a bounding box or around a point sorted by distance"""
+        try:
+            limit, cursor = page_args()
+            if 'q' in request.args:
+                if 'near' in request.args or 'bbox' in request.args:
+                    raise ValueError("q cannot be combined with bbox or near")
+                places, next_cursor = facade.search_places_text(request.args['q'], limit, cursor,
+                                                                columns=PLACE_LIST_COLUMNS)
+                return places, 200, next_link(next_cursor)
+            if 'near' in request.args:
+                latitude, longitude = parse_coordinates('near', 2)
+                check_point(latitude, longitude)
+                radius_km = number_arg('radius_km', DEFAULT_RADIUS_KM)
+                if not 0 < radius_km <= MAX_RADIUS_KM:
+                    raise ValueError(f"radius_km must be between 0 and {MAX_RADIUS_KM}")
+                results = facade.search_places(near=(latitude, longitude), radius_km=radius_km,
+                                               limit=limit, columns=PLACE_LIST_COLUMNS)
+            elif 'bbox' in request.args:
+                min_lon, min_lat, max_lon, max_lat = parse_coordinates('bbox', 4)
+                check_point(min_lat, min_lon)
+                check_point(max_lat, max_lon)
+                if min_lat > max_lat or min_lon > max_lon:
+                    raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+                results = facade.search_places(bbox=(min_lat, min_lon, max_lat, max_lon),
+                                               limit=limit, columns=PLACE_LIST_COLUMNS)
+            else:
+                raise ValueError("q, bbox or near is required")
+
+            return [dict(place, distance_km=round(distance, 3)) for place, distance in results], 200
+
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        except Exception as e:
+            return {'error': 'An error occurred while searching places'}, 500
+
+facet_model = api.model('AmenityFacet', {
+    'id': fields.String(description='Amenity ID'),
+    'name': fields.String(description='Name of the amenity'),
+    'count': fields.Integer(description='Matching places having this amenity')
+})
+
+place_facets_model = api.model('PlaceFacets', {
+    'total': fields.Integer(description='Number of matching places'),
+    'places': fields.List(fields.Nested(place_list_model), description='One page of matching places'),
+    'facets': fields.List(fields.Nested(facet_model), description='Amenity counts over the matching places')
+})
+
+def id_list(name):
+    """Comma separated IDs of the query string, empty when absent"""
+    return [value for value in request.args.get(name, '').split(',') if value]
+
+@api.route('/facets')
+class PlaceFacets(Resource):
+    @api.doc(params={'all': 'Amenity IDs the places must all have', 'any': 'Amenity IDs of which one is enough',
+                     'not': 'Amenity IDs the places must not have', 'limit': 'Page size (max 100)',
+                     'cursor': 'Cursor returned in the Link header'})
+    @api.response(200, 'Matching places and amenity counts', place_facets_model)
+    @api.response(400, 'Invalid parameters')
+    def get(self):
+        """Filter places by amenities (AND/OR/NOT) with per-amenity counts"""
+        try:
+            limit, cursor = page_args()
+            places, next_cursor, total, facets = facade.filter_places_by_amenities(
+                id_list('all'), id_list('any'), id_list('not'), limit, cursor, columns=PLACE_LIST_COLUMNS)
+            return {'total': total, 'places': places, 'facets': facets}, 200, next_link(next_cursor)
+
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        except Exception as e:
+            return {'error': 'An error occurred while filtering places'}, 500
+
 @api.route('/<place_id>')
 class PlaceResource(Resource):
+    @api.doc(params={'reviews': 'Also return the N latest reviews (max 20)',
+                     'fields': 'Comma separated fields to return, e.g. id,title,price',
+                     'include': 'Comma separated relations to embed: owner, amenities, reviews'})
     @api.response(200, 'Place details retrieved successfully', place_detail_model)
+    @api.response(400, 'Unknown fields or relations')
     @api.response(404, 'Place not found')
+    # Owner and amenity writes stale the place:<id> tag of the places they appear in
+    @response_cache.cached(ttl=60, tags=lambda place_id: [f'place:{place_id}', f'place_reviews:{place_id}'])
     def get(self, place_id):
         """Get place details by ID"""
         try:
-            # Get place using facade
-            place = facade.get_place(place_id)
-            
-            if not place:
+            reviews_limit = min(max(request.args.get('reviews', 0, type=int), 0), MAX_REVIEWS)
+            fields, include = fieldset_args(PLACE_DETAIL_FIELDS,
+                                            PLACE_DETAIL_INCLUDE + (('reviews',) if reviews_limit else ()))
+            if 'reviews' in include and not reviews_limit:
+                reviews_limit = MAX_REVIEWS
+
+            # The ETag comes from a version query, so a 304 skips loading the place graph
+            version = facade.get_place_version(place_id, with_reviews='reviews' in include)
+            if version is None:
                 return {'error': 'Place not found'}, 404
-            
-            # Get owner details
-            owner = facade.get_user_by_id(place.owner_id)
-            owner_data = None
-            if owner:
-                owner_data = {
-                    'id': owner.id,
-                    'first_name': owner.first_name,
-                    'last_name': owner.last_name,
-                    'email': owner.email
-                }
-            
-            # Get amenities details
-            amenities_data = []
-            if place.amenities:
-                amenities = facade.get_amenities_by_ids(place.amenities)
-                for amenity in amenities:
-                    amenities_data.append({
-                        'id': amenity.id,
-                        'name': amenity.name
-                    })
-            
-            # Return detailed place info with relationships
-            return {
-                'id': place.id,
-                'title': place.title,
-                'description': place.description,
-                'latitude': place.latitude,
-                'longitude': place.longitude,
-                'owner': owner_data,
-                'amenities': amenities_data
-            }, 200
-            
+            etag = make_etag(place_id, reviews_limit, ','.join(fields), ','.join(include), *version)
+            if is_fresh(etag):
+                return not_modified(etag)
+
+            # Exactly the requested columns and relations, one query each
+            place_data = facade.get_place_fieldset(place_id, fields, include, reviews_limit)
+            if place_data is None:
+                return {'error': 'Place not found'}, 404
+            return place_data, 200, {'ETag': etag}
+
+        except ValueError as e:
+            return {'error': str(e)}, 400
         except Exception as e:
             return {'error': 'An error occurred while retrieving the place'}, 500
 
@@ -1,5 +1,11 @@
+import json
+from flask import Response, request, stream_with_context
 from flask_restx import Namespace, Resource, fields
 from app.services import facade
+from app.api.v1.pagination import page_args, next_link
+from app.api.v1.etag import collection_etag, is_fresh, make_etag, not_modified
+from app.api.v1.fieldsets import fieldset_args, include_tags
+from app.services.response_cache import response_cache
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 api = Namespace('reviews', description='Review operations')
@@ -11,6 +17,14 @@ review_model = api.model('Review', {
     'place_id': fields.String(required=True, description='ID of the place')
 })
 
+# Columns rendered by the list views, fetched as plain rows
+REVIEW_LIST_FIELDS = ('id', 'text', 'rating', 'created_at')
+REVIEW_DETAIL_FIELDS = ('id', 'text', 'rating', 'user_id', 'place_id', 'created_at', 'updated_at')
+# Response cache tag of each relation that can be included
+RELATION_TAGS = {'user': 'users', 'place': 'places'}
+FIELDSET_PARAMS = {'fields': 'Comma separated fields to return, e.g. id,rating',
+                   'include': 'Comma separated relations to embed: user, place'}
+
 @api.route('/')
 class ReviewList(Resource):
     @api.expect(review_model)
@@ -29,10 +43,7 @@ class ReviewList(Resource):
         if place.owner_id == current_user['id']:
             return {"error": "Vous ne pouvez pas évaluer votre propre lieu"}, 400
 
-        existing_review = facade.get_review_by_user_and_place(current_user['id'], review_data['place_id'])
-        if existing_review:
-            return {"error": "Vous avez déjà évalué ce lieu"}, 400
-
+        # A duplicate review is refused by create_review (unique index), no pre-check needed
         review_data['user_id'] = current_user['id']
 
         try:
@@ -51,41 +62,75 @@ class ReviewList(Resource):
             return {"error": f"Unexpected error: {str(e)}"}, 400
 
 
+    @api.doc(params={'limit': 'Page size (max 100)', 'cursor': 'Cursor returned in the Link header',
+                     **FIELDSET_PARAMS})
     @api.response(200, 'List of reviews retrieved successfully')
+    @api.response(400, 'Invalid pagination parameters')
     def get(self):
-        """Retrieve a list of all reviews"""
+        """Retrieve a page of reviews, the next page is linked in the Link header"""
         try:
-            reviews = facade.get_all_reviews()
-            return [{
-                "id": r.id,
-                "text": r.text,
-                "rating": r.rating,
-                "created_at": r.created_at.isoformat()
-            } for r in reviews], 200
+            limit, cursor = page_args()
+            fields, include = fieldset_args(REVIEW_LIST_FIELDS)
+            reviews, next_cursor = facade.get_reviews_page(limit, cursor,
+                                                           columns=facade.review_columns(fields, include))
+            items, versions = facade.expand_reviews(reviews, fields, include)
+            etag = collection_etag(reviews, next_cursor, ','.join(fields), ','.join(include), *versions)
+            if is_fresh(etag):
+                return not_modified(etag)
+            return items, 200, dict(next_link(next_cursor), ETag=etag)
 
+        except ValueError as e:
+            return {"error": str(e)}, 400
         except Exception as e:
             return {"error": f"Unexpected error: {str(e)}"}, 500
 
 
+@api.route('/export')
+class ReviewExport(Resource):
+    @api.response(200, 'All reviews, one JSON object per line')
+    @api.response(403, 'Admin privileges required')
+    @jwt_required()
+    def get(self):
+        """Export every review as newline-delimited JSON (admin only)"""
+        current_user = get_jwt_identity()
+        if not current_user.get('is_admin', False):
+            return {'error': 'Admin privileges required'}, 403
+
+        def generate():
+            for r in facade.iter_all_reviews():
+                yield json.dumps({
+                    "id": r.id,
+                    "text": r.text,
+                    "rating": r.rating,
+                    "user_id": r.user_id,
+                    "place_id": r.place_id,
+                    "created_at": r.created_at.isoformat()
+                }) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @api.route('/<review_id>')
 class ReviewResource(Resource):
+    @api.doc(params=FIELDSET_PARAMS)
     @api.response(200, 'Review details retrieved successfully')
+    @api.response(400, 'Unknown fields or relations')
     @api.response(404, 'Review not found')
+    @response_cache.cached(ttl=60, tags=lambda review_id: [f'review:{review_id}', *include_tags(RELATION_TAGS)])
     def get(self, review_id):
         """Get review details by ID"""
-        review = facade.get_review(review_id)
-        if not review:
+        try:
+            fields, include = fieldset_args(REVIEW_DETAIL_FIELDS)
+            review, versions = facade.get_review_fieldset(review_id, fields, include)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        if review is None:
             return {"error": "Review not found"}, 404
+        etag = make_etag(review_id, ','.join(fields), ','.join(include), *versions)
+        if is_fresh(etag):
+            return not_modified(etag)
 
-        return {
-            "id": review.id,
-            "text": review.text,
-            "rating": review.rating,
-            "user_id": review.user_id,
-            "place_id": review.place_id,
-            "created_at": review.created_at.isoformat(),
-            "updated_at": review.updated_at.isoformat()
-        }, 200
+        return review, 200, {'ETag': etag}
 
     @api.expect(review_model)
     @api.response(200, 'Review updated successfully')
@@ -141,22 +186,32 @@ class ReviewResource(Resource):
 
 @api.route('/places/<place_id>/reviews')
 class PlaceReviewList(Resource):
+    @api.doc(params={'limit': 'Page size (max 100)', 'cursor': 'Cursor returned in the Link header',
+                     'sort': "'newest' (default) or 'rating'", **FIELDSET_PARAMS})
     @api.response(200, 'List of reviews for the place retrieved successfully')
+    @api.response(400, 'Invalid pagination or sort parameters')
     @api.response(404, 'Place not found')
+    @response_cache.cached(ttl=30, tags=lambda place_id: [f'place_reviews:{place_id}',
+                                                            *include_tags(RELATION_TAGS)])
     def get(self, place_id):
-        """Get all reviews for a specific place"""
+        """Get the reviews for a specific place, one page at a time"""
         try:
-            reviews = facade.get_reviews_by_place(place_id)
+            limit, cursor = page_args()
+            sort = request.args.get('sort', 'newest')
+            fields, include = fieldset_args(REVIEW_LIST_FIELDS)
+            reviews, next_cursor = facade.get_reviews_by_place(place_id, limit, cursor, sort,
+                                                               columns=facade.review_columns(fields, include))
 
-            if not reviews:
+            if not reviews and not cursor:
                 return {"error": "Place not found or has no reviews"}, 404
 
-            return [{
-                "id": r.id,
-                "text": r.text,
-                "rating": r.rating,
-                "created_at": r.created_at.isoformat()
-            } for r in reviews], 200
+            items, versions = facade.expand_reviews(reviews, fields, include)
+            etag = collection_etag(reviews, next_cursor, ','.join(fields), ','.join(include), *versions)
+            if is_fresh(etag):
+                return not_modified(etag)
+            return items, 200, dict(next_link(next_cursor), ETag=etag)
 
+        except ValueError as e:
+            return {"error": str(e)}, 400
         except Exception as e:
             return {"error": f"Unexpected error: {str(e)}"}, 500
\ No newline at end of file
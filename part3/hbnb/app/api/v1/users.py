@@ -1,6 +1,7 @@
 from flask_restx import Namespace, Resource, fields
 from app.services import facade
-from models.user import User
+from app.api.v1.pagination import page_args, next_link
+from app.models.user import User
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 
@@ -16,6 +17,9 @@ user_model = api.model('User', {
     'password': fields.String(required=True, description='Password of the user')
 })
 
+# Columns rendered by the list view; the password hash is never read
+USER_LIST_COLUMNS = ('id', 'first_name', 'last_name', 'email')
+
 @api.route('/')
 class UserList(Resource):
     @api.expect(user_model, validate=True)
@@ -49,12 +53,16 @@ class UserList(Resource):
     @api.response(201, 'User successfully created')
     @api.response(400, 'Email already registered')
     @api.response(400, 'Invalid input data')
+    @api.response(400, 'Invalid pagination parameters')
+    @api.doc(params={'limit': 'Page size (max 100)', 'cursor': 'Cursor returned in the Link header'})
     @jwt_required()
     def get(self):
-        users = facade.get_all_users()
-        return [{"id": user.id, "first_name": user.first_name, "last_name": user.last_name, "email": user.email}
-                for user in users
-                ], 200
+        try:
+            limit, cursor = page_args()
+            users, next_cursor = facade.get_users_page(limit, cursor, columns=USER_LIST_COLUMNS)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        return users, 200, next_link(next_cursor)
     
 
 
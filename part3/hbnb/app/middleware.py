@@ -0,0 +1,196 @@
+"""WSGI middleware compressing the responses, negotiated with Accept-Encoding.
+
+gzip is always available, brotli when the brotli package is installed. Bodies
+of known length are compressed at once, unless smaller than min_size; streamed
+bodies (no Content-Length, e.g. the NDJSON export) are compressed chunk by
+chunk as the application yields them, never buffered whole.
+"""
+import re
+import zlib
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript',
+                      'text/', 'image/svg+xml')
+# '-gzip' / '-br' appended inside an entity tag, for the compressed representation
+ETAG_SUFFIX = re.compile(r'-(gzip|br)"')
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        # wbits 16 + 15: zlib writes the gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressedStream:
+    """Compress an application iterable as it is consumed, closing it when done"""
+
+    def __init__(self, head, body, compressor):
+        self._head = head
+        self._body = body
+        self._compressor = compressor
+
+    def __iter__(self):
+        data = self._compressor.compress(b''.join(self._head))
+        if data:
+            yield data
+        for chunk in self._body:
+            data = self._compressor.compress(chunk)
+            if data:
+                yield data
+        yield self._compressor.finish()
+
+    def close(self):
+        if hasattr(self._body, 'close'):
+            self._body.close()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, level=6, min_size=500, brotli_quality=4):
+        """level is the gzip level (1-9), brotli_quality the brotli one (0-11),
+        bodies shorter than min_size bytes go out uncompressed"""
+        self.app = app
+        self.level = level
+        self.min_size = min_size
+        self.brotli_quality = brotli_quality
+
+    def choose_encoding(self, environ):
+        """'br', 'gzip' or None, by the client's preference then brotli first"""
+        accept = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        candidates = (['br'] if brotli is not None else []) + ['gzip']
+        best = max(candidates, key=lambda coding: accept.quality(coding))
+        return best if accept.quality(best) > 0 else None
+
+    def compressor(self, encoding):
+        if encoding == 'br':
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.level)
+
+    @staticmethod
+    def compressible(status, headers):
+        content_type = headers.get('Content-Type', '')
+        return (status.startswith('200')
+                and 'Content-Encoding' not in headers
+                and 'no-transform' not in headers.get('Cache-Control', '')
+                and content_type.startswith(COMPRESSIBLE_TYPES))
+
+    def __call__(self, environ, start_response):
+        encoding = self.choose_encoding(environ)
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        # The application only knows its own ETags: hide the suffixes the client got from us
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        suffixed = bool(if_none_match and ETAG_SUFFIX.search(if_none_match))
+        if suffixed:
+            environ['HTTP_IF_NONE_MATCH'] = ETAG_SUFFIX.sub('"', if_none_match)
+
+        captured = {}
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            captured['status'], captured['headers'] = status, Headers(headers)
+            return written.append
+
+        body = self.app(environ, capture)
+        status, headers = captured['status'], captured['headers']
+
+        if status.startswith('304') and suffixed:
+            self._suffix_etag(headers, encoding)
+        if not self.compressible(status, headers):
+            return self._passthrough(start_response, status, headers, written, body)
+
+        length = headers.get('Content-Length', type=int)
+        if length is not None:
+            if length < self.min_size:
+                return self._passthrough(start_response, status, headers, written, body)
+            try:
+                data = b''.join(written) + b''.join(body)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+            compressor = self.compressor(encoding)
+            data = compressor.compress(data) + compressor.finish()
+            self._set_encoding(headers, encoding)
+            headers['Content-Length'] = str(len(data))
+            start_response(status, headers.to_wsgi_list())
+            return [data]
+
+        # Streamed: read up to min_size bytes first, a short stream still goes out as is
+        iterator = iter(body)
+        head, size = list(written), sum(map(len, written))
+        while size < self.min_size:
+            chunk = next(iterator, None)
+            if chunk is None:
+                if hasattr(body, 'close'):
+                    body.close()
+                headers['Content-Length'] = str(size)
+                start_response(status, headers.to_wsgi_list())
+                return head
+            head.append(chunk)
+            size += len(chunk)
+        self._set_encoding(headers, encoding)
+        start_response(status, headers.to_wsgi_list())
+        return CompressedStream(head, _Remaining(iterator, body), self.compressor(encoding))
+
+    @staticmethod
+    def _passthrough(start_response, status, headers, written, body):
+        write = start_response(status, headers.to_wsgi_list())
+        for data in written:
+            write(data)
+        return body
+
+    def _set_encoding(self, headers, encoding):
+        headers['Content-Encoding'] = encoding
+        headers.remove('Content-Length')
+        vary = headers.get('Vary')
+        if not vary:
+            headers['Vary'] = 'Accept-Encoding'
+        elif 'accept-encoding' not in vary.lower():
+            headers['Vary'] = f'{vary}, Accept-Encoding'
+        self._suffix_etag(headers, encoding)
+
+    @staticmethod
+    def _suffix_etag(headers, encoding):
+        """A compressed body is another representation: its strong ETag must differ"""
+        etag = headers.get('ETag')
+        if etag and etag.endswith('"'):
+            headers['ETag'] = f'{etag[:-1]}-{encoding}"'
+
+
+class _Remaining:
+    """What is left of an application iterable, still closable"""
+
+    def __init__(self, iterator, body):
+        self._iterator = iterator
+        self._body = body
+
+    def __iter__(self):
+        return self._iterator
+
+    def close(self):
+        if hasattr(self._body, 'close'):
+            self._body.close()
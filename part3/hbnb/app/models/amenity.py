@@ -10,6 +10,12 @@ class Amenity(BaseModel):
     __tablename__ = 'amenities'
 
     name = db.Column(db.String(100), nullable=False)
+    __table_args__ = (
+        # Names are unique regardless of case; also serves lookups by name
+        db.Index('uq_amenities_name_lower', db.func.lower(name), unique=True),
+        # Keyset pages in (created_at, id) order, ties included
+        db.Index('ix_amenities_created_id', 'created_at', 'id'),
+    )
 
     def __init__(self, name):
         super().__init__()
@@ -1,27 +1,52 @@
 #!/usr/bin/python3
 from uuid import uuid4
 from datetime import datetime
+from sqlalchemy import DDL, event
+from sqlalchemy.ext.hybrid import hybrid_property
 from .user import User
 from .base_model import BaseModel
 from app import db
+from app.persistence import geo
 
 place_amenity = db.Table('place_amenity',
     db.Column('place_id', db.String(36), db.ForeignKey('places.id'), primary_key=True),
-    db.Column('amenity_id', db.String(36), db.ForeignKey('amenities.id'), primary_key=True)
+    db.Column('amenity_id', db.String(36), db.ForeignKey('amenities.id'), primary_key=True),
+    # The primary key serves place -> amenities, this one amenity -> places
+    db.Index('ix_place_amenity_amenity_place', 'amenity_id', 'place_id')
 )
 
 class Place(BaseModel):
     """Represents a place that can be rented in the HbnB app"""
     __tablename__ = 'places'
+    __table_args__ = (
+        # Serves price range filters and sort-by-price listings
+        db.Index('ix_places_price_id', 'price', 'id'),
+        # Owner pages and cascades from users
+        db.Index('ix_places_user_id', 'user_id'),
+        # Spatial search: a geohash prefix is a range scan on this index
+        db.Index('ix_places_geohash', 'geohash'),
+        # min_rating filters and best-rated-first listings
+        db.Index('ix_places_rating_avg_id', 'rating_avg', 'id'),
+        # Keyset pages in (created_at, id) order, ties included
+        db.Index('ix_places_created_id', 'created_at', 'id'),
+    )
 
     title = db.Column(db.String(50), nullable=False)
     description = db.Column(db.String(500), nullable=False)
-    price = db.Column(db.Float, nullable=False)
-    latitude = db.Column(db.Float, nullable=False)
-    longitude = db.Column(db.Float, nullable=False)
+    # Mapped under a private name so the validating hybrid properties below keep
+    # the public one; Place.price etc. still work in queries.
+    _price = db.Column('price', db.Float, nullable=False)
+    _latitude = db.Column('latitude', db.Float, nullable=False)
+    _longitude = db.Column('longitude', db.Float, nullable=False)
+    # Derived from latitude/longitude by their setters, never set directly
+    geohash = db.Column(db.String(geo.PRECISION), nullable=True)
+    # Review aggregates, maintained by the facade with each review write (0 when unrated)
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_avg = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     reviews = db.relationship('Review', backref='reviewed_place', lazy=True)
-    amenities = db.relationship('Amenity', secondary=place_amenity, backref=db.backref('places', lazy=True), lazy='subquery')
+    amenities = db.relationship('Amenity', secondary=place_amenity, backref=db.backref('places', lazy=True), lazy='select')
 
     def __init__(self, title, description, price, latitude, longitude, owner):
         super().__init__()
@@ -31,6 +56,9 @@ class Place(BaseModel):
         self.latitude = latitude
         self.longitude = longitude
         self.user_id = owner.id
+        self.review_count = 0
+        self.rating_sum = 0
+        self.rating_avg = 0.0
         self.reviews = []  # List to store related reviews
         self.amenities = []  # List to store related amenities
 
@@ -55,7 +83,7 @@ class Place(BaseModel):
         if not isinstance(owner, User):
             raise TypeError("Le propriétaire doit être une instance de User.")
 
-    @property
+    @hybrid_property
     def price(self):
         return self._price
     
@@ -68,7 +96,7 @@ class Place(BaseModel):
             raise ValueError("Price must be non-negative")
         self._price = float(value)
     
-    @property
+    @hybrid_property
     def latitude(self):
         return self._latitude
     
@@ -80,8 +108,9 @@ class Place(BaseModel):
         if not (-90 <= value <= 90):
             raise ValueError("Latitude must be between -90 and 90")
         self._latitude = float(value)
+        self._sync_geohash()
     
-    @property
+    @hybrid_property
     def longitude(self):
         return self._longitude
     
@@ -93,17 +122,27 @@ class Place(BaseModel):
         if not (-180 <= value <= 180):
             raise ValueError("Longitude must be between -180 and 180")
         self._longitude = float(value)
+        self._sync_geohash()
+
+    def _sync_geohash(self):
+        if self._latitude is not None and self._longitude is not None:
+            self.geohash = geo.encode(self._latitude, self._longitude)
     
-    def add_amenity(self, amenity_id):
+    def add_amenity(self, amenity):
         """Add an amenity to the place"""
-        if amenity_id not in self.amenities:
-            self.amenities.append(amenity_id)
+        if amenity not in self.amenities:
+            self.amenities.append(amenity)
             self.updated_at = datetime.now()
     
-    def remove_amenity(self, amenity_id):
+    def add_review(self, review):
+        """Add a review to the place"""
+        if review not in self.reviews:
+            self.reviews.append(review)
+
+    def remove_amenity(self, amenity):
         """Remove an amenity from the place"""
-        if amenity_id in self.amenities:
-            self.amenities.remove(amenity_id)
+        if amenity in self.amenities:
+            self.amenities.remove(amenity)
             self.updated_at = datetime.now()
     
     def update(self, data):
@@ -138,4 +177,11 @@ class Place(BaseModel):
         }
     
     def __repr__(self):
-        return f"<Place {self.id}: {self.title}>"
\ No newline at end of file
+        return f"<Place {self.id}: {self.title}>"
+
+
+# Full-text index on title/description (SQLite FTS5), kept up to date by PlaceRepository
+PLACES_FTS_DDL = DDL("CREATE VIRTUAL TABLE IF NOT EXISTS places_fts USING fts5("
+                     "place_id UNINDEXED, title, description, tokenize='unicode61 remove_diacritics 2')")
+event.listen(Place.__table__, 'after_create', PLACES_FTS_DDL.execute_if(dialect='sqlite'))
+event.listen(Place.__table__, 'before_drop', DDL("DROP TABLE IF EXISTS places_fts").execute_if(dialect='sqlite'))
@@ -10,7 +10,16 @@ from .place import Place
 class Review(BaseModel):
     """represents a Review tied to Place by Composition and dependent on User"""
     __tablename__ = 'reviews'
-    
+    __table_args__ = (
+        # One review per user and place; also serves the "already reviewed?" lookup
+        db.Index('uq_reviews_user_place', 'user_id', 'place_id', unique=True),
+        # Per-place listings, newest first or best rated first, id breaking the ties without a sort
+        db.Index('ix_reviews_place_created_id', 'place_id', 'created_at', 'id'),
+        db.Index('ix_reviews_place_rating_id', 'place_id', 'rating', 'created_at', 'id'),
+        # Keyset pages in (created_at, id) order, ties included
+        db.Index('ix_reviews_created_id', 'created_at', 'id'),
+    )
+
     text = db.Column(db.String(500), nullable=True)
     rating = db.Column(db.Integer, nullable=False)
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
@@ -21,7 +30,7 @@ class Review(BaseModel):
         super().__init__()
         self.text = text
         self.place_id = place.id
-        self.rating = float(rating)
+        self.rating = rating
         self.user_id = user.id
         self.validate_review()
 
@@ -9,6 +9,10 @@ from app import db, bcrypt
 
 class User(BaseModel):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Keyset pages in (created_at, id) order, ties included
+        db.Index('ix_users_created_id', 'created_at', 'id'),
+    )
 
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
@@ -1,11 +1,16 @@
+from sqlalchemy import func
 from app.models.amenity import Amenity
 from app import db
 from app.persistence.repository import SQLAlchemyRepository
 
 class AmenityRepository(SQLAlchemyRepository):
-    def __init__(self):
-        super().__init__(Amenity)
+    def __init__(self, cache=None):
+        super().__init__(Amenity, cache)
 
     def get_amenities_by_ids(self, amenity_ids):
         """Retrieves a list of amenities object by their ids"""
-        return Amenity.query.filter(Amenity.id.in_(amenity_ids)).all()
\ No newline at end of file
+        return self.get_many(amenity_ids)
+
+    def get_by_name(self, name):
+        """Case-insensitive lookup, a single probe of uq_amenities_name_lower"""
+        return self._query().filter(func.lower(Amenity.name) == name.lower()).first()
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""Geohash encoding and distance helpers used by the spatial place search"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# 9 characters is a cell of about 5m x 5m, plenty for a rental's position
+PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+# Upper bound for any geohash suffix: '~' sorts after every base32 character
+PREFIX_END = '~'
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Geohash of a point, neighbouring points share a long prefix"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) in degrees of a geohash cell"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def _steps(low, high, step):
+    values = []
+    value = low
+    while value < high:
+        values.append(value)
+        value += step
+    values.append(high)
+    return values
+
+
+def cover(min_lat, min_lon, max_lat, max_lon, max_cells=16):
+    """Geohash prefixes whose cells together cover the bounding box.
+
+    Picks the finest precision needing at most max_cells cells; [''] (everything)
+    when even one-character cells would need more.
+    """
+    for precision in range(PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor(max_lat / height) - math.floor(min_lat / height) + 1
+        cols = math.floor(max_lon / width) - math.floor(min_lon / width) + 1
+        if rows * cols <= max_cells:
+            return sorted({encode(lat, lon, precision)
+                           for lat in _steps(min_lat, max_lat, height)
+                           for lon in _steps(min_lon, max_lon, width)})
+    return ['']
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points, in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bbox_around(latitude, longitude, radius_km):
+    """(min_lat, min_lon, max_lat, max_lon) enclosing the circle of radius_km around a point"""
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(latitude - d_lat, -90.0), min(latitude + d_lat, 90.0)
+    if min_lat == -90.0 or max_lat == 90.0:
+        # The circle reaches a pole: every longitude is in range
+        return min_lat, -180.0, max_lat, 180.0
+    d_lon = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(latitude))))
+    min_lon, max_lon = longitude - d_lon, longitude + d_lon
+    if min_lon < -180.0 or max_lon > 180.0:
+        # Crossing the antimeridian, widen to the whole band rather than split the box
+        min_lon, max_lon = -180.0, 180.0
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def rank_by_distance(rows, latitude, longitude, radius_km=None, limit=None):
+    """(row, distance_km) pairs closest first, rows being objects or dicts with latitude/longitude"""
+    ranked = []
+    for row in rows:
+        lat, lon = (row['latitude'], row['longitude']) if isinstance(row, dict) else (row.latitude, row.longitude)
+        distance = haversine_km(latitude, longitude, lat, lon)
+        if radius_km is None or distance <= radius_km:
+            ranked.append((row, distance))
+    ranked.sort(key=lambda pair: pair[1])
+    return ranked[:limit] if limit is not None else ranked
@@ -0,0 +1,206 @@
+"""In-process secondary indexes kept next to the repositories"""
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lower-cased words without diacritics, the same split as the FTS5 unicode61 tokenizer"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return WORD.findall(text.lower())
+
+
+class InvertedIndex:
+    """Word -> documents postings with BM25 ranking and prefix matching.
+
+    Documents have weighted fields, e.g. {'title': 10.0, 'description': 1.0}:
+    a word in a heavier field counts for more.
+    """
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, weights):
+        self.weights = weights
+        self._postings = {}     # term -> {doc_id: weighted term frequency}
+        self._terms = []        # sorted terms, for prefix lookups
+        self._lengths = {}      # doc_id -> weighted length
+        self._doc_terms = {}    # doc_id -> terms, to remove a document
+
+    def add(self, doc_id, fields):
+        """Index (or re-index) a document given as {field: text}"""
+        self.remove(doc_id)
+        frequencies = {}
+        length = 0.0
+        for field, weight in self.weights.items():
+            for term in tokenize(fields.get(field)):
+                frequencies[term] = frequencies.get(term, 0.0) + weight
+                length += weight
+        for term, frequency in frequencies.items():
+            if term not in self._postings:
+                self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            self._postings[term][doc_id] = frequency
+        self._lengths[doc_id] = length
+        self._doc_terms[doc_id] = list(frequencies)
+
+    def remove(self, doc_id):
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+        self._lengths.pop(doc_id, None)
+
+    def _expand(self, prefix):
+        """Indexed terms starting with prefix"""
+        position = bisect.bisect_left(self._terms, prefix)
+        while position < len(self._terms) and self._terms[position].startswith(prefix):
+            yield self._terms[position]
+            position += 1
+
+    def search(self, query):
+        """[(doc_id, score)] of the documents matching every word of query (as a prefix), best first"""
+        words = tokenize(query)
+        if not words or not self._lengths:
+            return []
+        count = len(self._lengths)
+        average = sum(self._lengths.values()) / count or 1.0
+        scores = None
+        for word in words:
+            word_scores = {}
+            for term in self._expand(word):
+                postings = self._postings[term]
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.K1 * (1 - self.B + self.B * self._lengths[doc_id] / average)
+                    word_scores[doc_id] = word_scores.get(doc_id, 0.0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {doc_id: score + word_scores[doc_id] for doc_id, score in scores.items() if doc_id in word_scores}
+            if not scores:
+                return []
+        return sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+
+
+class BitmapIndex:
+    """Key -> bitset of the documents having that key.
+
+    Documents get dense integer ordinals and a bitset is a Python int whose bit n
+    is set when document n has the key, so AND/OR/NOT over keys are single
+    big-integer operations. Ordinals of removed documents are reused.
+
+    Bitsets are not compressed: each one takes about (highest ordinal) / 8 bytes
+    however few documents it holds, i.e. keys x documents bits overall. Fine for
+    a few hundred amenities over places; a large, sparse key space would want
+    run-length or roaring bitmaps.
+    """
+
+    def __init__(self):
+        self._ordinals = {}     # doc_id -> ordinal
+        self._doc_ids = []      # ordinal -> doc_id, None once freed
+        self._free = []         # freed ordinals, smallest reused first
+        self._bitmaps = {}      # key -> bitset
+        self._doc_keys = {}     # doc_id -> keys
+        self.universe = 0       # bitset of every document
+
+    def add_doc(self, doc_id):
+        """Register a document (possibly without any key), return its ordinal"""
+        ordinal = self._ordinals.get(doc_id)
+        if ordinal is None:
+            if self._free:
+                ordinal = heapq.heappop(self._free)
+            else:
+                ordinal = len(self._doc_ids)
+                self._doc_ids.append(None)
+            self._doc_ids[ordinal] = doc_id
+            self._ordinals[doc_id] = ordinal
+            self.universe |= 1 << ordinal
+        return ordinal
+
+    def add(self, doc_id, key):
+        bit = 1 << self.add_doc(doc_id)
+        self._bitmaps[key] = self._bitmaps.get(key, 0) | bit
+        self._doc_keys.setdefault(doc_id, set()).add(key)
+
+    def discard(self, doc_id, key):
+        ordinal = self._ordinals.get(doc_id)
+        if ordinal is None or key not in self._doc_keys.get(doc_id, ()):
+            return
+        bitmap = self._bitmaps[key] & ~(1 << ordinal)
+        if bitmap:
+            self._bitmaps[key] = bitmap
+        else:
+            del self._bitmaps[key]
+        self._doc_keys[doc_id].discard(key)
+
+    def set_keys(self, doc_id, keys):
+        """Make keys the exact key set of doc_id"""
+        keys = set(keys)
+        current = self._doc_keys.get(doc_id, set())
+        for key in current - keys:
+            self.discard(doc_id, key)
+        for key in keys - current:
+            self.add(doc_id, key)
+        self.add_doc(doc_id)
+
+    def remove_doc(self, doc_id):
+        for key in list(self._doc_keys.pop(doc_id, ())):
+            self._bitmaps[key] &= ~(1 << self._ordinals[doc_id])
+            if not self._bitmaps[key]:
+                del self._bitmaps[key]
+        ordinal = self._ordinals.pop(doc_id, None)
+        if ordinal is not None:
+            self._doc_ids[ordinal] = None
+            heapq.heappush(self._free, ordinal)
+            self.universe &= ~(1 << ordinal)
+
+    def remove_key(self, key):
+        self._bitmaps.pop(key, None)
+        for keys in self._doc_keys.values():
+            keys.discard(key)
+
+    def query(self, all_of=(), any_of=(), none_of=()):
+        """Bitset of the documents having every key of all_of, one of any_of and none of none_of"""
+        bits = self.universe
+        for key in all_of:
+            bits &= self._bitmaps.get(key, 0)
+        if any_of:
+            union = 0
+            for key in any_of:
+                union |= self._bitmaps.get(key, 0)
+            bits &= union
+        for key in none_of:
+            bits &= ~self._bitmaps.get(key, 0)
+        return bits
+
+    @staticmethod
+    def count(bits):
+        return bin(bits).count('1')
+
+    def doc_ids(self, bits, offset=0, limit=None):
+        """IDs of the documents in bits, in ordinal order"""
+        ids = []
+        while bits and (limit is None or len(ids) < limit):
+            lowest = bits & -bits
+            bits ^= lowest
+            if offset:
+                offset -= 1
+            else:
+                ids.append(self._doc_ids[lowest.bit_length() - 1])
+        return ids
+
+    def facet_counts(self, bits):
+        """{key: number of documents of bits having it}, keys without any left out"""
+        counts = {}
+        for key, bitmap in self._bitmaps.items():
+            count = self.count(bitmap & bits)
+            if count:
+                counts[key] = count
+        return counts
@@ -1,19 +1,415 @@
-from app.models.place import Place
+import hashlib
+import time
+from app.models.place import Place, place_amenity
 from app.models.amenity import Amenity
+from app.models.user import User
 from app import db
-from app.persistence.repository import SQLAlchemyRepository
+from sqlalchemy import Float, and_, case, cast, event, func, inspect, or_, select, text, update
+from app.models.review import Review
+from app.persistence import geo
+from app.persistence.indexes import BitmapIndex, InvertedIndex, tokenize
+from app.persistence.repository import (InMemoryRepository, SQLAlchemyRepository, decode_cursor,
+                                        decode_offset, encode_cursor, unit_of_work)
+
+# Columns kept in places_fts, and their bm25() weights: a title match counts ten times more
+TEXT_COLUMNS = ('id', 'title', 'description')
+TEXT_WEIGHTS = {'title': 10.0, 'description': 1.0}
+
+INDEX_TEXT_SQL = text("INSERT OR REPLACE INTO places_fts (rowid, place_id, title, description) "
+                      "VALUES (:rowid, :place_id, :title, :description)")
+
+
+def fts_rowid(place_id):
+    """Stable 56-bit rowid for a place id, so its FTS row is replaced and deleted by rowid"""
+    return int.from_bytes(hashlib.blake2b(place_id.encode(), digest_size=7).digest(), 'big')
+
+
+def text_rows(rows):
+    """Parameters of INDEX_TEXT_SQL for (id, title, description) rows"""
+    return [{'rowid': fts_rowid(place_id), 'place_id': place_id, 'title': title, 'description': description}
+            for place_id, title, description in rows]
+
+
+def amenity_page(bitmap, all_of=(), any_of=(), none_of=(), limit=None, cursor=None):
+    """(place_ids, next_cursor, total) of the places matching the amenity filters"""
+    bits = bitmap.query(all_of, any_of, none_of)
+    offset = decode_offset(cursor)
+    place_ids = bitmap.doc_ids(bits, offset, limit)
+    total = bitmap.count(bits)
+    next_cursor = encode_cursor([offset + limit]) if limit is not None and total > offset + limit else None
+    return place_ids, next_cursor, total
+
 
 class PlaceRepository(SQLAlchemyRepository):
-    def __init__(self):
-        super().__init__(Place)
+    # Seconds between two checks that no other process changed the places or their amenities
+    AMENITY_INDEX_CHECK = 5
+
+    def __init__(self, cache=None):
+        super().__init__(Place, cache)
+        # Amenity -> places bitmap, built on first use then kept in step with committed changes
+        self._amenity_bitmap = None
+        self._amenity_version = None
+        self._amenity_checked = 0.0
+        self._pending_key = ('amenity_bitmap', id(self))
+        event.listen(db.session, 'after_flush', self._stage_amenity_changes)
+        event.listen(db.session, 'after_commit', self._apply_amenity_changes)
+        event.listen(db.session, 'after_soft_rollback', self._discard_amenity_changes)
+
+    def _amenity_fingerprint(self):
+        """Moves with every committed write to places or place_amenity, whoever made it"""
+        return tuple(db.session.execute(select(
+            select(func.count()).select_from(Place).scalar_subquery(),
+            select(func.max(Place.updated_at)).scalar_subquery(),
+            select(func.count()).select_from(place_amenity).scalar_subquery())).one())
+
+    def _amenity_index(self):
+        # The bitmap only follows this process's commits: rebuild it when another worker wrote
+        now = time.monotonic()
+        if self._amenity_bitmap is not None and now - self._amenity_checked >= self.AMENITY_INDEX_CHECK:
+            self._amenity_checked = now
+            if self._amenity_fingerprint() != self._amenity_version:
+                self._amenity_bitmap = None
+        if self._amenity_bitmap is None:
+            # Taken before reading: a write landing meanwhile triggers another rebuild, never a miss
+            self._amenity_version = self._amenity_fingerprint()
+            self._amenity_checked = now
+            bitmap = BitmapIndex()
+            for place_id in db.session.execute(select(Place.id)).scalars():
+                bitmap.add_doc(place_id)
+            for place_id, amenity_id in db.session.execute(select(place_amenity.c.place_id,
+                                                                  place_amenity.c.amenity_id)):
+                bitmap.add(place_id, amenity_id)
+            self._amenity_bitmap = bitmap
+        return self._amenity_bitmap
+
+    def _stage_amenity_changes(self, session, flush_context):
+        """Record what this flush changed; applied on commit, dropped on rollback"""
+        if self._amenity_bitmap is None:
+            return
+        pending = session.info.setdefault(self._pending_key, [])
+        for obj in session.new | session.dirty:
+            if isinstance(obj, Place):
+                history = inspect(obj).attrs.amenities.history
+                if obj in session.new or history.has_changes():
+                    pending.append(('place', obj.id, [amenity.id for amenity in history.added],
+                                    [amenity.id for amenity in history.deleted]))
+        for obj in session.deleted:
+            if isinstance(obj, Place):
+                pending.append(('delete_place', obj.id, (), ()))
+            elif isinstance(obj, Amenity):
+                pending.append(('delete_amenity', obj.id, (), ()))
+
+    def _apply_amenity_changes(self, session):
+        pending = session.info.pop(self._pending_key, ())
+        if self._amenity_bitmap is None:
+            return
+        for change, obj_id, added, removed in pending:
+            if change == 'place':
+                self._amenity_bitmap.add_doc(obj_id)
+                for amenity_id in added:
+                    self._amenity_bitmap.add(obj_id, amenity_id)
+                for amenity_id in removed:
+                    self._amenity_bitmap.discard(obj_id, amenity_id)
+            elif change == 'delete_place':
+                self._amenity_bitmap.remove_doc(obj_id)
+            else:
+                self._amenity_bitmap.remove_key(obj_id)
+
+    def _discard_amenity_changes(self, session, previous_transaction):
+        if previous_transaction.parent is None:
+            session.info.pop(self._pending_key, None)
+
+    def find_by_amenities(self, all_of=(), any_of=(), none_of=(), limit=None, cursor=None, columns=None):
+        """Places having every amenity of all_of, one of any_of and none of none_of,
+        as (places, next_cursor, total), answered from the bitmap index"""
+        place_ids, next_cursor, total = amenity_page(self._amenity_index(), all_of, any_of, none_of, limit, cursor)
+        return self._get_in_order(place_ids, columns), next_cursor, total
+
+    def amenity_facets(self, all_of=(), any_of=(), none_of=()):
+        """{amenity_id: number of matching places having it}"""
+        bitmap = self._amenity_index()
+        return bitmap.facet_counts(bitmap.query(all_of, any_of, none_of))
+
+    def _has_fts(self):
+        return db.session.get_bind().dialect.name == 'sqlite'
+
+    def _index_text(self, rows):
+        if rows and self._has_fts():
+            db.session.execute(INDEX_TEXT_SQL, text_rows(rows))
+
+    def _reindex_text(self, place_ids):
+        """Copy the current title/description of place_ids into places_fts"""
+        if not self._has_fts():
+            return
+        for start in range(0, len(place_ids), self.IN_CHUNK_SIZE):
+            chunk = place_ids[start:start + self.IN_CHUNK_SIZE]
+            self._index_text(self._query(columns=TEXT_COLUMNS).filter(Place.id.in_(chunk)).all())
+
+    def _unindex_text(self, place_ids):
+        if place_ids and self._has_fts():
+            db.session.execute(text("DELETE FROM places_fts WHERE rowid = :rowid"),
+                               [{'rowid': fts_rowid(place_id)} for place_id in place_ids])
+
+    # Writes keep places_fts in step within the same transaction
+    def add(self, obj):
+        with unit_of_work():
+            super().add(obj)
+            self._index_text([(obj.id, obj.title, obj.description)])
+
+    def add_many(self, objs):
+        rows = [self._to_row(obj) for obj in objs]
+        with unit_of_work():
+            super().add_many(rows)
+            self._index_text([(row['id'], row.get('title'), row.get('description')) for row in rows])
+            if self._amenity_bitmap is not None:
+                # A bulk INSERT is not seen by flush events, stage the new places here
+                db.session.info.setdefault(self._pending_key, []).extend(
+                    ('place', row['id'], (), ()) for row in rows)
+
+    def update(self, obj_id, data):
+        with unit_of_work():
+            super().update(obj_id, data)
+            if 'title' in data or 'description' in data:
+                self._reindex_text([obj_id])
+
+    def update_many(self, rows):
+        rows = [self._to_row(row) for row in rows]
+        with unit_of_work():
+            super().update_many(rows)
+            self._reindex_text([row['id'] for row in rows if 'title' in row or 'description' in row])
+
+    def delete(self, obj_id):
+        with unit_of_work():
+            super().delete(obj_id)
+            self._unindex_text([obj_id])
+
+    def search_text(self, query, limit, cursor=None, columns=None):
+        """Places matching every word of query (as a prefix), best match first, and the next page cursor.
+
+        Ranked by bm25() over places_fts on SQLite; other backends fall back to
+        unranked LIKE filters.
+        """
+        words = tokenize(query)
+        if not words:
+            raise ValueError("Search query must contain at least one word")
+        offset = decode_offset(cursor)
+        if self._has_fts():
+            weights = ', '.join(str(weight) for weight in (0.0, *TEXT_WEIGHTS.values()))
+            ids = db.session.execute(
+                text(f"SELECT place_id FROM places_fts WHERE places_fts MATCH :match "
+                     f"ORDER BY bm25(places_fts, {weights}), rowid LIMIT :limit OFFSET :offset"),
+                {'match': ' '.join(f'"{word}"*' for word in words), 'limit': limit + 1, 'offset': offset}
+            ).scalars().all()
+        else:
+            matching = self._query(columns=('id',))
+            for word in words:
+                pattern = f'%{word}%'
+                matching = matching.filter(or_(Place.title.ilike(pattern), Place.description.ilike(pattern)))
+            ids = [row.id for row in matching.order_by(Place.created_at, Place.id).limit(limit + 1).offset(offset)]
+        next_cursor = encode_cursor([offset + limit]) if len(ids) > limit else None
+        return self._get_in_order(ids[:limit], columns), next_cursor
+
+    def _get_in_order(self, place_ids, columns=None):
+        if not columns:
+            return self.get_many(place_ids)
+        projection = columns if 'id' in columns else ('id', *columns)
+        found = {row['id']: row for row in
+                 self._as_dicts(self._query(columns=projection).filter(Place.id.in_(place_ids)), projection)}
+        rows = [found[place_id] for place_id in place_ids if place_id in found]
+        if projection is not columns:
+            rows = [{name: row[name] for name in columns} for row in rows]
+        return rows
+
+    def get_by_price_range(self, min_price=None, max_price=None, limit=None, cursor=None, columns=None):
+        """Places priced within the bounds, cheapest first: a range scan on ix_places_price_id"""
+        return self.find_by_range('price', min_price, max_price, limit, cursor, columns)
+
+    def get_by_rating(self, min_rating=None, limit=None, cursor=None, columns=None):
+        """Places rated at least min_rating, best rated first: a range scan on ix_places_rating_avg_id"""
+        query = self._query(columns=columns)
+        if min_rating is not None:
+            query = query.filter(Place.rating_avg >= min_rating)
+        order = [Place.rating_avg, Place.id]
+        if limit is None:
+            rows = query.order_by(*[column.desc() for column in order]).all()
+            return (self._as_dicts(rows, columns) if columns else rows), None
+        return self._keyset_page(query, order, limit, cursor, descending=True, projection=columns)
+
+    def apply_rating_delta(self, place_id, count_delta, sum_delta):
+        """Add a review write to the aggregates of a place, atomically in SQL so concurrent
+        reviews cannot lose an increment. Runs in the caller's unit of work."""
+        db.session.execute(update(Place).where(Place.id == place_id).values(
+            review_count=Place.review_count + count_delta, rating_sum=Place.rating_sum + sum_delta))
+        # Second statement: MySQL would evaluate the SET clauses left to right
+        db.session.execute(update(Place).where(Place.id == place_id).values(rating_avg=self._average()))
+        self._invalidate(place_id)
+        self._commit()
+
+    @staticmethod
+    def _average():
+        return case((Place.review_count > 0, cast(Place.rating_sum, Float) / Place.review_count), else_=0.0)
+
+    def reconcile_ratings(self):
+        """Recompute the aggregates of the places that drifted from their reviews, return how many"""
+        stats = (select(Review.place_id, func.count(Review.id).label('count'), func.sum(Review.rating).label('total'))
+                 .group_by(Review.place_id).subquery())
+        count, total = func.coalesce(stats.c.count, 0), func.coalesce(stats.c.total, 0)
+        drifted = db.session.execute(
+            select(Place.id, count, total).outerjoin(stats, stats.c.place_id == Place.id)
+            .where(or_(Place.review_count != count, Place.rating_sum != total))).all()
+        self.update_many([{'id': place_id, 'review_count': review_count, 'rating_sum': rating_sum,
+                           'rating_avg': rating_sum / review_count if review_count else 0.0}
+                          for place_id, review_count, rating_sum in drifted])
+        return len(drifted)
+
+    def get_in_bbox(self, min_lat, min_lon, max_lat, max_lon, columns=None):
+        """Places inside the box: range scans on ix_places_geohash for the covering cells,
+        then an exact check on the coordinates"""
+        cells = geo.cover(min_lat, min_lon, max_lat, max_lon)
+        query = self._query(columns=columns).filter(
+            or_(*(and_(Place.geohash >= cell, Place.geohash < cell + geo.PREFIX_END) for cell in cells)),
+            Place.latitude.between(min_lat, max_lat),
+            Place.longitude.between(min_lon, max_lon))
+        return self._as_dicts(query, columns) if columns else query.all()
+
+    def get_version(self, place_id, with_reviews=False):
+        """What the detail view of a place is built from, cheaply: the updated_at of the
+        place and its owner, the count and latest updated_at of its amenities (and
+        reviews). One query on primary keys and indexes; None for an unknown place."""
+        linked = place_amenity.c.place_id == Place.id
+        columns = [Place.updated_at, User.updated_at,
+                   select(func.count()).select_from(place_amenity).where(linked).scalar_subquery(),
+                   select(func.max(Amenity.updated_at))
+                   .join(place_amenity, place_amenity.c.amenity_id == Amenity.id).where(linked).scalar_subquery()]
+        if with_reviews:
+            # A deleted review moves review_count, hence places.updated_at, already
+            columns.append(select(func.max(Review.updated_at)).where(Review.place_id == Place.id).scalar_subquery())
+        row = db.session.execute(select(*columns).select_from(Place).join(User, User.id == Place.user_id)
+                                 .where(Place.id == place_id)).first()
+        return tuple(row) if row else None
+
+    def get_amenity_rows(self, place_ids, columns):
+        """{place_id: [amenity dicts of columns, by name]} for several places, one join per IN chunk"""
+        place_ids = list(dict.fromkeys(place_ids))
+        found = {place_id: [] for place_id in place_ids}
+        selected = [Amenity.__table__.c[name] for name in columns]
+        for start in range(0, len(place_ids), self.IN_CHUNK_SIZE):
+            chunk = place_ids[start:start + self.IN_CHUNK_SIZE]
+            rows = db.session.execute(
+                select(place_amenity.c.place_id, *selected)
+                .join(Amenity, Amenity.id == place_amenity.c.amenity_id)
+                .where(place_amenity.c.place_id.in_(chunk)).order_by(Amenity.name, Amenity.id))
+            for place_id, *values in rows:
+                found[place_id].append(dict(zip(columns, values)))
+        return found
 
-    def get_by_price_range(self, min_price, max_price):
-        return self.model.query.filter(Place.price >= min_price, Place.price <= max_price).all()
-    
     def get_by_owner(self, owner_id):
-        return self.model.query.filter(Place.owner_id == owner_id).all()
-    
+        return self._query().filter(Place.user_id == owner_id).all()
+
+    def get_ids_by_owner(self, owner_id):
+        """IDs of the places of owner_id, read from the ix_places_user_id index"""
+        return list(db.session.scalars(select(Place.id).where(Place.user_id == owner_id)))
+
+    def get_ids_by_amenity(self, amenity_id):
+        """IDs of the places having amenity_id, read from the ix_place_amenity_amenity_place index"""
+        return list(db.session.scalars(select(place_amenity.c.place_id)
+                                       .where(place_amenity.c.amenity_id == amenity_id)))
+
     def get_places_by_ids(self, place_ids):
         """Retrieve places by their IDs."""
-        # Assuming place_ids is a list of integers (IDs of the places)
-        return self.model.query.filter(Place.id.in_(place_ids)).all()
\ No newline at end of file
+        return self.get_many(place_ids)
+
+
+class InMemoryPlaceRepository(InMemoryRepository):
+    def __init__(self):
+        # The sorted geohash list doubles as grid buckets: one cell is one bisect range
+        super().__init__(indexes=('user_id',), sorted_indexes=('price', 'geohash'))
+        self._text = InvertedIndex(TEXT_WEIGHTS)
+        self._amenity_bitmap = BitmapIndex()
+
+    def _index_text(self, obj):
+        self._text.add(obj.id, {'title': obj.title, 'description': obj.description})
+
+    def _index_amenities(self, obj):
+        self._amenity_bitmap.set_keys(obj.id, [amenity.id for amenity in obj.amenities])
+
+    def add(self, obj):
+        super().add(obj)
+        self._index_text(obj)
+        self._index_amenities(obj)
+
+    def update(self, obj_id, data):
+        super().update(obj_id, data)
+        obj = self.get(obj_id)
+        if obj:
+            self._index_text(obj)
+            self._index_amenities(obj)
+
+    def delete(self, obj_id):
+        super().delete(obj_id)
+        self._text.remove(obj_id)
+        self._amenity_bitmap.remove_doc(obj_id)
+
+    def find_by_amenities(self, all_of=(), any_of=(), none_of=(), limit=None, cursor=None, columns=None):
+        place_ids, next_cursor, total = amenity_page(self._amenity_bitmap, all_of, any_of, none_of, limit, cursor)
+        return self._project(self.get_many(place_ids), columns), next_cursor, total
+
+    def amenity_facets(self, all_of=(), any_of=(), none_of=()):
+        return self._amenity_bitmap.facet_counts(self._amenity_bitmap.query(all_of, any_of, none_of))
+
+    def get_by_rating(self, min_rating=None, limit=None, cursor=None, columns=None):
+        places = [place for place in self._storage.values() if min_rating is None or place.rating_avg >= min_rating]
+        places.sort(key=lambda place: (place.rating_avg, place.id), reverse=True)
+        if cursor:
+            position = decode_cursor(cursor)
+            places = [place for place in places if [place.rating_avg, place.id] < position]
+        next_cursor = None
+        if limit is not None and len(places) > limit:
+            places = places[:limit]
+            next_cursor = encode_cursor([places[-1].rating_avg, places[-1].id])
+        return self._project(places, columns), next_cursor
+
+    def apply_rating_delta(self, place_id, count_delta, sum_delta):
+        place = self.get(place_id)
+        if place:
+            place.review_count += count_delta
+            place.rating_sum += sum_delta
+            place.rating_avg = place.rating_sum / place.review_count if place.review_count else 0.0
+
+    def search_text(self, query, limit, cursor=None, columns=None):
+        if not tokenize(query):
+            raise ValueError("Search query must contain at least one word")
+        offset = decode_offset(cursor)
+        matches = self._text.search(query)
+        places = [self._storage[place_id] for place_id, score in matches[offset:offset + limit]]
+        next_cursor = encode_cursor([offset + limit]) if len(matches) > offset + limit else None
+        return self._project(places, columns), next_cursor
+
+    def get_amenity_rows(self, place_ids, columns):
+        found = {}
+        for place_id in dict.fromkeys(place_ids):
+            place = self._storage.get(place_id)
+            amenities = sorted(place.amenities, key=lambda amenity: (amenity.name, amenity.id)) if place else []
+            found[place_id] = self._project(amenities, columns)
+        return found
+
+    def get_version(self, place_id, with_reviews=False):
+        place = self._storage.get(place_id)
+        if place is None:
+            return None
+        version = (place.updated_at, place.owner.updated_at if place.owner else None, len(place.amenities),
+                   max((amenity.updated_at for amenity in place.amenities), default=None))
+        if with_reviews:
+            version += (max((review.updated_at for review in place.reviews), default=None),)
+        return version
+
+    def get_by_price_range(self, min_price=None, max_price=None, limit=None, cursor=None, columns=None):
+        return self.find_by_range('price', min_price, max_price, limit, cursor, columns)
+
+    def get_in_bbox(self, min_lat, min_lon, max_lat, max_lon, columns=None):
+        places = []
+        for cell in geo.cover(min_lat, min_lon, max_lat, max_lon):
+            candidates, _ = self.find_by_range('geohash', cell, cell + geo.PREFIX_END)
+            places.extend(place for place in candidates
+                          if min_lat <= place.latitude <= max_lat and min_lon <= place.longitude <= max_lon)
+        return self._project(places, columns)
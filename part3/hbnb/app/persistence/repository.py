@@ -1,6 +1,74 @@
+import base64
+import bisect
+import json
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import and_, event, inspect, insert, or_, update
+from sqlalchemy.orm import make_transient_to_detached, raiseload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 from app import db
-from app.persistence.repository import SQLAlchemyRepository
+
+
+@contextmanager
+def unit_of_work():
+    """Group repository writes into a single transaction.
+
+    Repositories skip their own commit while a unit of work is open; the
+    outermost block commits once on exit, or rolls back if anything raised.
+    Blocks may be nested, only the outermost one commits.
+    """
+    session = db.session
+    depth = session.info.get('uow_depth', 0)
+    session.info['uow_depth'] = depth + 1
+    try:
+        yield session
+        if depth == 0:
+            session.commit()
+    except Exception:
+        if depth == 0:
+            session.rollback()
+        raise
+    finally:
+        session.info['uow_depth'] = depth
+
+
+def encode_cursor(values):
+    """Pack the sort key of the last row of a page into an opaque, URL-safe token"""
+    def default(value):
+        if isinstance(value, datetime):
+            return {'dt': value.isoformat()}
+        raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+    raw = json.dumps(list(values), default=default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor, raises ValueError on a malformed token"""
+    def object_hook(obj):
+        if 'dt' in obj:
+            return datetime.fromisoformat(obj['dt'])
+        return obj
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw, object_hook=object_hook)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def decode_offset(cursor):
+    """Offset held by the cursor of a ranked listing, 0 without cursor"""
+    if not cursor:
+        return 0
+    values = decode_cursor(cursor)
+    if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+        raise ValueError("Invalid cursor")
+    return values[0]
 
 
 class Repository(ABC):
@@ -9,11 +77,19 @@ class Repository(ABC):
         pass
 
     @abstractmethod
-    def get(self, obj_id):
+    def get(self, obj_id, options=()):
         pass
 
     @abstractmethod
-    def get_all(self):
+    def get_many(self, obj_ids, options=(), columns=None):
+        """Return the objects found for obj_ids, in the order of obj_ids.
+
+        With columns, return plain dicts holding only those columns (and id) instead of objects.
+        """
+        pass
+
+    @abstractmethod
+    def get_all(self, options=()):
         pass
 
     @abstractmethod
@@ -28,60 +104,421 @@ class Repository(ABC):
     def get_by_attribute(self, attr_name, attr_value):
         pass
 
+    @abstractmethod
+    def find_all_by_attribute(self, attr_name, attr_value):
+        pass
+
+    @abstractmethod
+    def find_by_range(self, attr_name, low=None, high=None, limit=None, cursor=None, columns=None):
+        """Return (objects, next_cursor) with low <= attr <= high, ordered by (attr, id)"""
+        pass
+
+    @abstractmethod
+    def get_page(self, limit, cursor=None, options=(), columns=None):
+        """Return (objects, next_cursor), ordered by (created_at, id).
+
+        With columns, return plain dicts holding only those columns instead of objects.
+        """
+        pass
+
+    @abstractmethod
+    def iter_all(self, batch_size=1000):
+        """Yield every object without loading them all at once"""
+        pass
+
+    @abstractmethod
+    def add_many(self, objs):
+        pass
+
+    @abstractmethod
+    def update_many(self, rows):
+        pass
+
+    @staticmethod
+    def _with_id(columns):
+        """columns, with id first when missing: rows are matched back to their ids"""
+        return tuple(columns) if 'id' in columns else ('id', *columns)
+
 
 class InMemoryRepository(Repository):
-    def __init__(self):
+    def __init__(self, indexes=(), unique_indexes=(), sorted_indexes=()):
+        """indexes / unique_indexes name the attributes to keep a hash index on,
+        sorted_indexes the ones to keep a sorted (value, id) list on for range queries"""
         self._storage = {}
+        self._unique = {attr: {} for attr in unique_indexes}
+        self._indexes = {attr: {} for attr in indexes}
+        self._sorted = {attr: [] for attr in sorted_indexes}
+        self._indexed_values = {}
+
+    def _index(self, obj):
+        """Register obj in the secondary indexes, refusing duplicate unique values"""
+        values = {attr: getattr(obj, attr, None) for attr in (*self._unique, *self._indexes, *self._sorted)}
+        for attr, index in self._unique.items():
+            owner = index.get(values[attr])
+            if values[attr] is not None and owner is not None and owner != obj.id:
+                raise ValueError(f"{attr} '{values[attr]}' already exists")
+        self._index_values(obj.id, values)
+
+    def _index_values(self, obj_id, values):
+        for attr, index in self._unique.items():
+            if values[attr] is not None:
+                index[values[attr]] = obj_id
+        for attr, index in self._indexes.items():
+            index.setdefault(values[attr], set()).add(obj_id)
+        for attr, index in self._sorted.items():
+            if values[attr] is not None:
+                bisect.insort(index, (values[attr], obj_id))
+        self._indexed_values[obj_id] = values
+
+    def _unindex(self, obj_id):
+        """Drop obj_id from the indexes, using the values it was indexed under"""
+        values = self._indexed_values.pop(obj_id, None)
+        if values is None:
+            return None
+        for attr, index in self._unique.items():
+            if index.get(values[attr]) == obj_id:
+                del index[values[attr]]
+        for attr, index in self._indexes.items():
+            ids = index.get(values[attr])
+            if ids is not None:
+                ids.discard(obj_id)
+                if not ids:
+                    del index[values[attr]]
+        for attr, index in self._sorted.items():
+            position = bisect.bisect_left(index, (values[attr], obj_id)) if values[attr] is not None else len(index)
+            if position < len(index) and index[position] == (values[attr], obj_id):
+                del index[position]
+        return values
+
+    def _reindex(self, obj, previous):
+        """Index obj again, putting back the previous entries if that fails"""
+        try:
+            self._index(obj)
+        except ValueError:
+            if previous is not None:
+                self._index_values(obj.id, previous)
+            raise
 
     def add(self, obj):
+        self._reindex(obj, self._unindex(obj.id))
         self._storage[obj.id] = obj
 
-    def get(self, obj_id):
+    def get(self, obj_id, options=()):
         return self._storage.get(obj_id)
 
-    def get_all(self):
+    def get_many(self, obj_ids, options=(), columns=None):
+        objs = [self._storage[obj_id] for obj_id in dict.fromkeys(obj_ids) if obj_id in self._storage]
+        return self._project(objs, self._with_id(columns) if columns else None)
+
+    def get_all(self, options=()):
         return list(self._storage.values())
 
     def update(self, obj_id, data):
         obj = self.get(obj_id)
         if obj:
-            obj.update(data)
+            previous = self._unindex(obj_id)
+            try:
+                obj.update(data)
+                self._index(obj)
+            except Exception:
+                # Whatever failed, obj keeps its indexed values and its index entries
+                for attr, value in (previous or {}).items():
+                    if getattr(obj, attr, None) != value:
+                        setattr(obj, attr, value)
+                if previous is not None:
+                    self._index_values(obj_id, previous)
+                raise
 
     def delete(self, obj_id):
         if obj_id in self._storage:
+            self._unindex(obj_id)
             del self._storage[obj_id]
 
     def get_by_attribute(self, attr_name, attr_value):
+        if attr_name in self._unique:
+            return self._storage.get(self._unique[attr_name].get(attr_value))
+        if attr_name in self._indexes:
+            ids = self._indexes[attr_name].get(attr_value)
+            return self._storage[next(iter(ids))] if ids else None
         return next((obj for obj in self._storage.values() if getattr(obj, attr_name) == attr_value), None)
+
+    def find_all_by_attribute(self, attr_name, attr_value):
+        if attr_name in self._unique:
+            obj = self.get_by_attribute(attr_name, attr_value)
+            return [obj] if obj else []
+        if attr_name in self._indexes:
+            return [self._storage[obj_id] for obj_id in self._indexes[attr_name].get(attr_value, ())]
+        return [obj for obj in self._storage.values() if getattr(obj, attr_name) == attr_value]
+
+    @staticmethod
+    def _project(objs, columns):
+        if not columns:
+            return objs
+        return [{name: getattr(obj, name) for name in columns} for obj in objs]
+
+    def find_by_range(self, attr_name, low=None, high=None, limit=None, cursor=None, columns=None):
+        """Bisect into the sorted index of attr_name: O(log n + k)"""
+        index = self._sorted[attr_name]
+        start = bisect.bisect_left(index, (low,)) if low is not None else 0
+        if cursor:
+            start = max(start, bisect.bisect_right(index, tuple(decode_cursor(cursor))))
+        objs = []
+        for position in range(start, len(index)):
+            value, obj_id = index[position]
+            if high is not None and value > high:
+                break
+            if limit is not None and len(objs) == limit:
+                return self._project(objs, columns), encode_cursor(index[position - 1])
+            objs.append(self._storage[obj_id])
+        return self._project(objs, columns), None
+
+    def get_page(self, limit, cursor=None, options=(), columns=None):
+        objs = sorted(self._storage.values(), key=lambda obj: (obj.created_at, obj.id))
+        if cursor:
+            position = decode_cursor(cursor)
+            objs = [obj for obj in objs if [obj.created_at, obj.id] > position]
+        next_cursor = None
+        if len(objs) > limit:
+            objs = objs[:limit]
+            next_cursor = encode_cursor([objs[-1].created_at, objs[-1].id])
+        return self._project(objs, columns), next_cursor
+
+    def iter_all(self, batch_size=1000):
+        yield from list(self._storage.values())
+
+    def add_many(self, objs):
+        for obj in objs:
+            self.add(obj)
+
+    def update_many(self, rows):
+        """Update several objects, each row is a dict holding the object 'id'"""
+        for row in rows:
+            data = dict(row)
+            self.update(data.pop('id'), data)
     
 
 class SQLAlchemyRepository(Repository):
-    def __init__(self, model):
+    # IDs per IN (...) list, well under SQLite's bound parameter limit
+    IN_CHUNK_SIZE = 500
+
+    def __init__(self, model, cache=None):
+        """cache: optional LRUCache serving get() by id, invalidated by this repository's writes"""
         self.model = model
+        self.cache = cache
+        # Ids written in the current transaction, evicted once it commits or rolls back.
+        # Listening even without a cache lets one be set later (facade.init_app)
+        self._evict_key = ('cache_evictions', id(self))
+        event.listen(db.session, 'after_commit', self._evict_pending)
+        event.listen(db.session, 'after_soft_rollback', self._evict_rolled_back)
+
+    def _commit(self):
+        """Commit now, unless a unit of work will commit for us"""
+        if db.session.info.get('uow_depth', 0):
+            return
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _loader_options(self, options=()):
+        """The caller's eager loads; with SQLALCHEMY_RAISELOAD on (tests), any other relationship raises"""
+        options = list(options)
+        if has_app_context() and current_app.config.get('SQLALCHEMY_RAISELOAD'):
+            options.append(raiseload('*'))
+        return options
+
+    def _query(self, options=(), columns=None):
+        """Base query, relationships are only loaded when options ask for them.
+
+        With columns (table column names), select just those: rows come back as
+        plain tuples, never hydrated into the identity map.
+        """
+        if columns:
+            return self.model.query.with_entities(*[self.model.__table__.c[name] for name in columns])
+        options = self._loader_options(options)
+        query = self.model.query
+        return query.options(*options) if options else query
 
     def add(self, obj):
         db.session.add(obj)
-        db.session.commit()
+        self._commit()
+
+    def get(self, obj_id, options=()):
+        if self.cache is None or options:
+            # With eager loads requested, refresh an object already in the session so they apply
+            return db.session.get(self.model, obj_id, options=self._loader_options(options),
+                                  populate_existing=bool(options))
+        obj = db.session.identity_map.get(identity_key(self.model, obj_id))
+        if obj is not None:
+            return obj
+        values = self.cache.get(obj_id)
+        if values is not None:
+            return self._attach(values)
+        obj = db.session.get(self.model, obj_id, options=self._loader_options())
+        if obj is not None:
+            self.cache.set(obj_id, self._snapshot(obj))
+        return obj
+
+    def _snapshot(self, obj):
+        """Column values of obj, safe to share between sessions"""
+        return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+    def _attach(self, values):
+        """Rebuild a persistent instance from a snapshot without touching the database"""
+        obj = self.model.__mapper__.class_manager.new_instance()
+        for key, value in values.items():
+            set_committed_value(obj, key, value)
+        make_transient_to_detached(obj)
+        db.session.add(obj)
+        return obj
 
-    def get(self, obj_id):
-        return self.model.query.get(obj_id)
+    def _invalidate(self, obj_id):
+        """Evict obj_id from the cache once the transaction ends: evicting earlier would let
+        a concurrent get() cache the row again as it was before the commit"""
+        if self.cache is not None:
+            db.session.info.setdefault(self._evict_key, set()).add(obj_id)
 
-    def get_all(self):
-        return self.model.query.all()
+    def _evict_pending(self, session):
+        obj_ids = session.info.pop(self._evict_key, ())
+        if self.cache is not None:
+            for obj_id in obj_ids:
+                self.cache.delete(obj_id)
+
+    def _evict_rolled_back(self, session, previous_transaction):
+        # A snapshot may have been cached from the rolled back changes, drop it too
+        if previous_transaction.parent is None:
+            self._evict_pending(session)
+
+    def get_many(self, obj_ids, options=(), columns=None):
+        """One WHERE id IN (...) query per IN_CHUNK_SIZE ids instead of one query per id"""
+        obj_ids = list(dict.fromkeys(obj_ids))
+        columns = self._with_id(columns) if columns else None
+        found = {}
+        for start in range(0, len(obj_ids), self.IN_CHUNK_SIZE):
+            chunk = obj_ids[start:start + self.IN_CHUNK_SIZE]
+            query = self._query(options, columns).filter(self.model.id.in_(chunk))
+            for obj in (self._as_dicts(query, columns) if columns else query):
+                found[obj['id'] if columns else obj.id] = obj
+        return [found[obj_id] for obj_id in obj_ids if obj_id in found]
+
+    def get_all(self, options=()):
+        return self._query(options).all()
 
     def update(self, obj_id, data):
         obj = self.get(obj_id)
         if obj:
             for key, value in data.items():
                 setattr(obj, key, value)
-            db.session.commit()
+            self._invalidate(obj_id)
+            self._commit()
 
     def delete(self, obj_id):
         obj = self.get(obj_id)
         if obj:
             db.session.delete(obj)
-            db.session.commit()
+            self._invalidate(obj_id)
+            self._commit()
 
     def get_by_attribute(self, attr_name, attr_value):
-        return self.model.query.filter_by(**{attr_name: attr_value}).first()
+        return self._query().filter_by(**{attr_name: attr_value}).first()
+
+    def find_all_by_attribute(self, attr_name, attr_value):
+        return self._query().filter_by(**{attr_name: attr_value}).all()
+
+    def iter_all(self, batch_size=1000):
+        """Stream every row through a server-side cursor, batch_size rows per fetch.
+
+        Rows already yielded are only weakly referenced by the session, so
+        memory stays bounded by the batch rather than by the table.
+        """
+        yield from self._query().yield_per(batch_size)
+
+    def _keyset_page(self, query, columns, limit, cursor=None, descending=False, projection=None):
+        """Page through query ordered by columns, resuming strictly after cursor.
+
+        The cursor holds the sort key of the last row already served, so each
+        page is a range scan on the index behind columns, whatever the page.
+        A query built by _query(columns=projection) yields dicts of those columns.
+        """
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != len(columns):
+                raise ValueError("Invalid cursor")
+            query = query.filter(self._after(columns, values, descending))
+        if projection:
+            query = query.add_columns(*[column.label(f'_key{i}') for i, column in enumerate(columns)])
+        order = [column.desc() if descending else column.asc() for column in columns]
+        rows = query.order_by(*order).limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            if projection:
+                next_cursor = encode_cursor([getattr(rows[-1], f'_key{i}') for i in range(len(columns))])
+            else:
+                next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+        if projection:
+            rows = self._as_dicts(rows, projection)
+        return rows, next_cursor
+
+    @staticmethod
+    def _as_dicts(rows, projection):
+        return [dict(zip(projection, row)) for row in rows]
+
+    @staticmethod
+    def _after(columns, values, descending):
+        """(c1, c2, ...) > (v1, v2, ...) as c1 >= v1 AND (c1 > v1 OR ...).
+
+        The planner cannot start an index range from the OR alone (SQLite scans the
+        whole index): the plain bound on c1 seeks to the cursor, the OR drops the ties.
+        """
+        clauses = []
+        for i, column in enumerate(columns):
+            equal = [columns[j] == values[j] for j in range(i)]
+            beyond = column < values[i] if descending else column > values[i]
+            clauses.append(and_(*equal, beyond))
+        start = columns[0] <= values[0] if descending else columns[0] >= values[0]
+        return and_(start, or_(*clauses))
+
+    def find_by_range(self, attr_name, low=None, high=None, limit=None, cursor=None, columns=None):
+        column = getattr(self.model, attr_name)
+        query = self._query(columns=columns)
+        if low is not None:
+            query = query.filter(column >= low)
+        if high is not None:
+            query = query.filter(column <= high)
+        if limit is None:
+            rows = query.order_by(column, self.model.id).all()
+            return (self._as_dicts(rows, columns) if columns else rows), None
+        return self._keyset_page(query, [column, self.model.id], limit, cursor, projection=columns)
+
+    def get_page(self, limit, cursor=None, options=(), columns=None):
+        return self._keyset_page(self._query(options, columns), [self.model.created_at, self.model.id],
+                                 limit, cursor, projection=columns)
+
+    def _to_row(self, obj):
+        """Column values of a model instance, as a dict usable by a bulk statement"""
+        if isinstance(obj, dict):
+            return obj
+        state = inspect(obj)
+        return {attr.key: state.dict[attr.key]
+                for attr in state.mapper.column_attrs if attr.key in state.dict}
+
+    def add_many(self, objs):
+        """Insert many rows with a single executemany INSERT"""
+        rows = [self._to_row(obj) for obj in objs]
+        if not rows:
+            return
+        db.session.execute(insert(self.model), rows)
+        self._commit()
+
+    def update_many(self, rows):
+        """Bulk UPDATE by primary key, each row is a dict holding the object 'id'"""
+        rows = [self._to_row(row) for row in rows]
+        if not rows:
+            return
+        db.session.execute(update(self.model), rows)
+        for row in rows:
+            self._invalidate(row['id'])
+        self._commit()
     
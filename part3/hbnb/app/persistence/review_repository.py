@@ -3,9 +3,26 @@ from app import db
 from app.persistence.repository import SQLAlchemyRepository
 
 class ReviewRepository(SQLAlchemyRepository):
-    def __init__(self):
-        super().__init__(Review)
+    # Sort key of each ordering, all descending; both are covered by an index led by place_id
+    SORTS = {
+        'newest': (Review.created_at, Review.id),
+        'rating': (Review.rating, Review.created_at, Review.id),
+    }
 
-    def get_reviews_by_place(self, place_id):
-        # Retrieve all reviews for a specific place
-        return self.model.query.filter_by(place_id=place_id).all()
\ No newline at end of file
+    def __init__(self, cache=None):
+        super().__init__(Review, cache)
+
+    def get_reviews_by_place(self, place_id, limit=None, cursor=None, sort='newest', options=(), columns=None):
+        """Retrieve the reviews of a specific place, one page at a time when limit is set"""
+        if sort not in self.SORTS:
+            raise ValueError(f"sort must be one of: {', '.join(self.SORTS)}")
+        order = list(self.SORTS[sort])
+        query = self._query(options, columns).filter(Review.place_id == place_id)
+        if limit is None:
+            rows = query.order_by(*[column.desc() for column in order]).all()
+            return (self._as_dicts(rows, columns) if columns else rows), None
+        return self._keyset_page(query, order, limit, cursor, descending=True, projection=columns)
+
+    def get_by_user_and_place(self, user_id, place_id):
+        """Single probe of the uq_reviews_user_place index"""
+        return self._query().filter_by(user_id=user_id, place_id=place_id).first()
\ No newline at end of file
@@ -4,8 +4,8 @@ from app.persistence.repository import SQLAlchemyRepository
 
 
 class UserRepository(SQLAlchemyRepository):
-    def __init__(self):
-        super().__init__(User)
+    def __init__(self, cache=None):
+        super().__init__(User, cache)
 
     def get_user_by_email(self, email):
-        return self.model.query.filter_by(email=email).first()
\ No newline at end of file
+        return self._query().filter_by(email=email).first()
\ No newline at end of file
@@ -1,4 +1,8 @@
 
+from datetime import datetime
+from flask import g, has_request_context
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from app.models.user import User
 from app.models.amenity import Amenity
 from app.models.place import Place
@@ -7,6 +11,39 @@ from app.persistence.user_repository import UserRepository
 from app.persistence.place_repository import PlaceRepository
 from app.persistence.review_repository import ReviewRepository
 from app.persistence.amenity_repository import AmenityRepository
+from app.persistence.repository import unit_of_work
+from app.persistence.cache import LRUCache
+from app.persistence import geo
+from app.services.response_cache import response_cache
+
+# ?fields= names of the place and review endpoints, and the column behind each
+PLACE_FIELDS = {'id': 'id', 'title': 'title', 'description': 'description', 'price': 'price',
+                'latitude': 'latitude', 'longitude': 'longitude', 'owner_id': 'user_id',
+                'review_count': 'review_count', 'rating_avg': 'rating_avg',
+                'created_at': 'created_at', 'updated_at': 'updated_at'}
+REVIEW_FIELDS = {name: name for name in ('id', 'text', 'rating', 'user_id', 'place_id', 'created_at', 'updated_at')}
+# ?include= relations and the columns shown for the related rows
+PLACE_RELATIONS = {'owner': ('id', 'first_name', 'last_name', 'email'), 'amenities': ('id', 'name'),
+                   'reviews': ('id', 'text', 'rating', 'user_id')}
+REVIEW_RELATIONS = {'user': ('id', 'first_name', 'last_name'), 'place': ('id', 'title')}
+# Foreign key column of the to-one relations
+RELATION_KEYS = {'owner': 'user_id', 'user': 'user_id', 'place': 'place_id'}
+
+
+def _is_duplicate_review(error):
+    """Whether an IntegrityError is a uq_reviews_user_place violation: PostgreSQL and
+    MySQL name the index, SQLite lists its columns"""
+    message = str(error.orig)
+    return 'uq_reviews_user_place' in message or 'reviews.user_id, reviews.place_id' in message
+
+
+def _is_duplicate_amenity(error):
+    """Whether an IntegrityError is a uq_amenities_name_lower violation, every backend names the index"""
+    return 'uq_amenities_name_lower' in str(error.orig)
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
 
 ...
 
@@ -16,10 +53,43 @@ from app.persistence.amenity_repository import AmenityRepository
 
 class HBnBFacade:
     def __init__(self):
-        self.user_repo = UserRepository(User)        
+        self.user_repo = UserRepository()
         self.place_repo = PlaceRepository()
         self.review_repo = ReviewRepository()
         self.amenity_repo = AmenityRepository()
+
+    def init_app(self, app):
+        """Read-mostly entities get a bounded cache in front of repo.get() when
+        REPOSITORY_CACHE_TTL is set, none otherwise"""
+        ttl = app.config.get('REPOSITORY_CACHE_TTL')
+        size = app.config.get('REPOSITORY_CACHE_SIZE', 4096)
+        for repo in (self.user_repo, self.place_repo, self.amenity_repo):
+            repo.cache = LRUCache(maxsize=size, ttl=ttl) if ttl else None
+
+    def transaction(self):
+        """Open a unit of work: every write inside it is committed once, at the end"""
+        return unit_of_work()
+
+    def get_cache_stats(self):
+        """Hit/miss counters of the repository caches, None for a disabled one"""
+        return {name: repo.cache.stats() if repo.cache is not None else None
+                for name, repo in (('users', self.user_repo), ('places', self.place_repo),
+                                   ('amenities', self.amenity_repo))}
+
+    def _get(self, repo, obj_id):
+        """repo.get() memoized for the current request, so repeated lookups of an id cost one read"""
+        # Only a request bounds the memo: an app context may live as long as a script or worker
+        if not has_request_context():
+            return repo.get(obj_id)
+        memo = g.setdefault('_facade_memo', {})
+        key = (repo.model.__name__, obj_id)
+        if key not in memo:
+            memo[key] = repo.get(obj_id)
+        return memo[key]
+
+    def clear_request_memo(self, exc=None):
+        """Drop the per-request memo, registered as a teardown handler"""
+        g.pop('_facade_memo', None)
         
     def create_user(self, user_data):
         user = User(**user_data)
@@ -27,23 +97,38 @@ class HBnBFacade:
         self.user_repo.add(user)
 
         return user
+
+    def create_users(self, users_data):
+        """Create many users at once with a single bulk INSERT"""
+        users = []
+        for user_data in users_data:
+            user_data = dict(user_data)
+            password = user_data.pop('password')
+            user = User(**user_data)
+            user.hash_password(password)
+            users.append(user)
+        self.user_repo.add_many(users)
+        return users
     
     def get_user(self, user_id):
-        return self.user_repo.get(user_id)
+        return self._get(self.user_repo, user_id)
     
     def get_user_by_email(self, email):
         return self.user_repo.get_user_by_email(email)
     
     def get_all_users(self):
         return self.user_repo.get_all()
+
+    def get_users_page(self, limit, cursor=None, columns=None):
+        return self.user_repo.get_page(limit, cursor, columns=columns)
     
     def update_user(self, user_id, update_data):
         user = self.get_user(user_id)
         if not user:
             return None
-        for key, value in update_data.items():
-            setattr(user, key, value)
-        self.user_repo.update(user_id, user)
+        self.user_repo.update(user_id, update_data)
+        # The detail of each place shows its owner
+        response_cache.invalidate('users', *self._place_tags(self.place_repo.get_ids_by_owner(user_id)))
         return user
     
     def create_amenity(self, amenity_data):
@@ -52,31 +137,39 @@ class HBnBFacade:
         if not amenity_data.get('name'):
             raise ValueError("Amenity name is required")
         
-        # Check if amenity with same name already exists
-        existing_amenities = self.amenity_repo.get_all()
-        for amenity in existing_amenities:
-            if amenity.name.lower() == amenity_data['name'].lower():
-                raise ValueError("Amenity with this name already exists")
-        
-        # Create new amenity
+        # Create new amenity, the case-insensitive unique index rejects duplicates
         amenity = Amenity(name=amenity_data['name'])
-        self.amenity_repo.add(amenity)
+        try:
+            self.amenity_repo.add(amenity)
+        except IntegrityError as e:
+            if not _is_duplicate_amenity(e):
+                raise
+            raise ValueError("Amenity with this name already exists")
+        response_cache.invalidate('amenities')
         return amenity
 
     def get_amenity(self, amenity_id):
         """Retrieve an amenity by ID"""
-        amenity = self.amenity_repo.get(amenity_id)
+        amenity = self._get(self.amenity_repo, amenity_id)
         if not amenity:
             return None
         return amenity
 
+    def get_amenity_by_name(self, name):
+        """Retrieve an amenity by name, ignoring case"""
+        return self.amenity_repo.get_by_name(name)
+
     def get_all_amenities(self):
         """Retrieve all amenities"""
         return self.amenity_repo.get_all()
 
+    def get_amenities_page(self, limit, cursor=None, columns=None):
+        """Retrieve one page of amenities and the cursor of the next one"""
+        return self.amenity_repo.get_page(limit, cursor, columns=columns)
+
     def update_amenity(self, amenity_id, amenity_data):
         """Update an amenity"""
-        amenity = self.amenity_repo.get(amenity_id)
+        amenity = self._get(self.amenity_repo, amenity_id)
         if not amenity:
             return None
 
@@ -84,21 +177,27 @@ class HBnBFacade:
             new_name = amenity_data['name']
             if not new_name:
                 raise ValueError("Amenity name cannot be empty")
-            # Vérifie les doublons
-            existing_amenities = self.amenity_repo.get_all()
-            for existing_amenity in existing_amenities:
-                if (existing_amenity.id != amenity_id and 
-                    existing_amenity.name.lower() == new_name.lower()):
-                    raise ValueError("Amenity with this name already exists")
 
             try:
                 amenity.name = new_name
             except Exception as e:
                 raise ValueError(f"Invalid name: {str(e)}")
 
-        self.amenity_repo.update(amenity_id, amenity_data)
+        # Duplicates are rejected by the unique index on lower(name)
+        try:
+            self.amenity_repo.update(amenity_id, amenity_data)
+        except IntegrityError as e:
+            if not _is_duplicate_amenity(e):
+                raise
+            raise ValueError("Amenity with this name already exists")
+        # The detail of each place lists its amenities
+        response_cache.invalidate('amenities', *self._place_tags(self.place_repo.get_ids_by_amenity(amenity_id)))
         return amenity
 
+    @staticmethod
+    def _place_tags(place_ids):
+        return [f'place:{place_id}' for place_id in place_ids]
+
     def create_place(self, place_data):
         """Create a new place with validation for price, latitude, and longitude"""
         # Validate required fields
@@ -108,16 +207,12 @@ class HBnBFacade:
                 raise ValueError(f"{field} is required")
         
         # Verify that the owner exists
-        owner = self.user_repo.get(place_data['owner_id'])
+        owner = self._get(self.user_repo, place_data['owner_id'])
         if not owner:
             raise ValueError("Owner not found")
         
         # Verify that all amenities exist
-        amenities = place_data.get('amenities', [])
-        for amenity_id in amenities:
-            amenity = self.amenity_repo.get(amenity_id)
-            if not amenity:
-                raise ValueError(f"Amenity with ID {amenity_id} not found")
+        amenities = self._get_existing_amenities(place_data.get('amenities', []))
         
         # Create place (validation happens in the constructor via setters)
         try:
@@ -131,10 +226,12 @@ class HBnBFacade:
             longitude=place_data['longitude'],
             owner=owner,
             )
-            for amenity_id in place_data.get('amenities', []):
-                place.add_amenity(amenity_id)
+            with self.transaction():
+                for amenity in amenities:
+                    place.add_amenity(amenity)
 
-            self.place_repo.add(place)
+                self.place_repo.add(place)
+            response_cache.invalidate('places')
             return place
         except Exception as e:
             print(f"[Erreur] Exception levée : {e}")
@@ -146,38 +243,171 @@ class HBnBFacade:
 
     def get_place(self, place_id):
         """Retrieve a place by ID, including associated owner and amenities"""
-        place = self.place_repo.get(place_id)
+        place = self._get(self.place_repo, place_id)
         if not place:
             return None
         return place
 
+    @staticmethod
+    def _fieldset_columns(known_fields, known_relations, fields, include):
+        """Columns to select for ?fields= / ?include=, ValueError on an unknown name"""
+        unknown = [name for name in fields if name not in known_fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        unknown = [name for name in include if name not in known_relations]
+        if unknown:
+            raise ValueError(f"Unknown relations: {', '.join(unknown)}")
+        # id and updated_at always come along: relations hang off the id, ETags use both
+        keys = [RELATION_KEYS[name] for name in include if name in RELATION_KEYS]
+        return tuple(dict.fromkeys(['id', 'updated_at', *(known_fields[name] for name in fields), *keys]))
+
+    def place_columns(self, fields, include=()):
+        """Place columns needed to answer ?fields= and ?include="""
+        return self._fieldset_columns(PLACE_FIELDS, PLACE_RELATIONS, fields, include)
+
+    def review_columns(self, fields, include=()):
+        """Review columns needed to answer ?fields= and ?include="""
+        return self._fieldset_columns(REVIEW_FIELDS, REVIEW_RELATIONS, fields, include)
+
+    def _to_one(self, repo, rows, relation, columns):
+        """{row id: related row} for a to-one relation, one batched query"""
+        key = RELATION_KEYS[relation]
+        related = {row['id']: row for row in repo.get_many([row[key] for row in rows], columns=columns)}
+        return {row['id']: related.get(row[key]) for row in rows}
+
+    def expand_places(self, rows, fields, include=(), reviews_limit=None):
+        """Place rows (from place_columns) as dicts of the requested fields and relations.
+
+        Each relation costs one query for the whole list; reviews, the reviews_limit
+        latest ones, only for a single place. Returns (items, versions), versions
+        being the id@updated_at of every related row, for ETags.
+        """
+        related = {}
+        if 'owner' in include:
+            related['owner'] = self._to_one(self.user_repo, rows, 'owner', PLACE_RELATIONS['owner'] + ('updated_at',))
+        if 'amenities' in include:
+            related['amenities'] = self.place_repo.get_amenity_rows(
+                [row['id'] for row in rows], PLACE_RELATIONS['amenities'] + ('updated_at',))
+        if 'reviews' in include:
+            if reviews_limit is None:
+                raise ValueError("reviews can only be included for a single place")
+            related['reviews'] = {row['id']: self.review_repo.get_reviews_by_place(
+                row['id'], reviews_limit, columns=PLACE_RELATIONS['reviews'] + ('updated_at',))[0] for row in rows}
+        return self._shape(rows, PLACE_FIELDS, fields, related)
+
+    def expand_reviews(self, rows, fields, include=()):
+        """Review rows (from review_columns) as dicts of the requested fields and relations,
+        and the versions of the related rows, as expand_places"""
+        related = {}
+        if 'user' in include:
+            related['user'] = self._to_one(self.user_repo, rows, 'user', REVIEW_RELATIONS['user'] + ('updated_at',))
+        if 'place' in include:
+            related['place'] = self._to_one(self.place_repo, rows, 'place', REVIEW_RELATIONS['place'] + ('updated_at',))
+        return self._shape(rows, REVIEW_FIELDS, fields, related)
+
+    @staticmethod
+    def _shape(rows, known_fields, fields, related):
+        items, versions = [], []
+
+        def public(row):
+            # updated_at of related rows only feeds the versions
+            versions.append(f"{row['id']}@{row['updated_at']}")
+            return {name: _json_value(value) for name, value in row.items() if name != 'updated_at'}
+
+        for row in rows:
+            item = {name: _json_value(row[known_fields[name]]) for name in fields}
+            for relation, by_id in related.items():
+                value = by_id.get(row['id'])
+                if isinstance(value, list):
+                    item[relation] = [public(other) for other in value]
+                else:
+                    item[relation] = public(value) if value else None
+            items.append(item)
+        return items, versions
+
+    def get_place_fieldset(self, place_id, fields, include=(), reviews_limit=20):
+        """One place with just the requested fields and relations, None if unknown"""
+        rows = self.place_repo.get_many([place_id], columns=self.place_columns(fields, include))
+        if not rows:
+            return None
+        return self.expand_places(rows, fields, include, reviews_limit)[0][0]
+
+    def get_review_fieldset(self, review_id, fields, include=()):
+        """One review with just the requested fields and relations, and their versions; (None, None) if unknown"""
+        rows = self.review_repo.get_many([review_id], columns=self.review_columns(fields, include))
+        if not rows:
+            return None, None
+        items, versions = self.expand_reviews(rows, fields, include)
+        return items[0], [rows[0]['updated_at'], *versions]
+
+    def get_place_version(self, place_id, with_reviews=False):
+        """Version of what get_place_fieldset returns, for ETags, without loading it; None if unknown"""
+        return self.place_repo.get_version(place_id, with_reviews)
+
     def get_all_places(self):
         """Retrieve all places"""
         return self.place_repo.get_all()
 
+    def get_places_page(self, limit, cursor=None, columns=None):
+        """Retrieve one page of places and the cursor of the next one"""
+        return self.place_repo.get_page(limit, cursor, columns=columns)
+
+    def get_places_by_price(self, min_price=None, max_price=None, limit=None, cursor=None, columns=None):
+        """Retrieve places within a price range, cheapest first"""
+        return self.place_repo.get_by_price_range(min_price, max_price, limit, cursor, columns)
+
+    def search_places(self, bbox=None, near=None, radius_km=None, limit=None, columns=None):
+        """Places inside bbox (min_lat, min_lon, max_lat, max_lon) or within radius_km of
+        near (lat, lon), as (place, distance_km) pairs closest to the center first"""
+        if near is not None:
+            center = near
+            bbox = geo.bbox_around(near[0], near[1], radius_km)
+        else:
+            center = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+            radius_km = None
+        places = self.place_repo.get_in_bbox(*bbox, columns=columns)
+        return geo.rank_by_distance(places, center[0], center[1], radius_km, limit)
+
+    def search_places_text(self, query, limit, cursor=None, columns=None):
+        """Places matching the words of query, best match first, and the next page cursor"""
+        return self.place_repo.search_text(query, limit, cursor, columns)
+
+    def filter_places_by_amenities(self, all_of=(), any_of=(), none_of=(), limit=None, cursor=None, columns=None):
+        """Places matching the amenity filters, the next page cursor, their total and,
+        per amenity, how many of them have it"""
+        places, next_cursor, total = self.place_repo.find_by_amenities(all_of, any_of, none_of, limit, cursor, columns)
+        counts = self.place_repo.amenity_facets(all_of, any_of, none_of)
+        facets = [{'id': amenity.id, 'name': amenity.name, 'count': counts[amenity.id]}
+                  for amenity in self.amenity_repo.get_many(list(counts))]
+        facets.sort(key=lambda facet: (-facet['count'], facet['name']))
+        return places, next_cursor, total, facets
+
     def update_place(self, place_id, place_data):
         """Update a place"""
-        place = self.place_repo.get(place_id)
+        # Replacing the amenities needs the current ones, nothing else is loaded
+        if 'amenities' in place_data:
+            place = self.place_repo.get(place_id, options=(selectinload(Place.amenities),))
+        else:
+            place = self._get(self.place_repo, place_id)
         if not place:
             return None
         
         # Verify owner exists if owner_id is being updated
         if 'owner_id' in place_data:
-            owner = self.user_repo.get(place_data['owner_id'])
+            owner = self._get(self.user_repo, place_data['owner_id'])
             if not owner:
                 raise ValueError("Owner not found")
         
         # Verify amenities exist if amenities are being updated
         if 'amenities' in place_data:
-            for amenity_id in place_data['amenities']:
-                amenity = self.amenity_repo.get(amenity_id)
-                if not amenity:
-                    raise ValueError(f"Amenity with ID {amenity_id} not found")
+            place_data = dict(place_data, amenities=self._get_existing_amenities(place_data['amenities']))
         
         # Update place (validation happens via setters)
         try:
-            place.update(place_data)
-            self.place_repo.update(place_id, place)
+            with self.transaction():
+                place.update(place_data)
+                self.place_repo.update(place_id, place_data)
+            response_cache.invalidate('places', f'place:{place_id}')
             return place
         except ValueError as e:
             raise ValueError(f"Invalid update data: {str(e)}")
@@ -185,15 +415,19 @@ class HBnBFacade:
     # Helper methods to get related data
     def get_user_by_id(self, user_id):
         """Get user details by ID"""
-        return self.user_repo.get(user_id)
+        return self._get(self.user_repo, user_id)
     
     def get_amenities_by_ids(self, amenity_ids):
         """Get amenities details by their IDs"""
-        amenities = []
+        return self.amenity_repo.get_many(amenity_ids)
+
+    def _get_existing_amenities(self, amenity_ids):
+        """Load amenities in one batch, raising if any of the IDs is unknown"""
+        amenities = self.amenity_repo.get_many(amenity_ids)
+        found = {amenity.id for amenity in amenities}
         for amenity_id in amenity_ids:
-            amenity = self.amenity_repo.get(amenity_id)
-            if amenity:
-                amenities.append(amenity)
+            if amenity_id not in found:
+                raise ValueError(f"Amenity with ID {amenity_id} not found")
         return amenities
     
     def create_review(self, review_data):
@@ -202,11 +436,11 @@ class HBnBFacade:
             if field not in review_data:
                 raise ValueError(f"{field} is required")
 
-        user = self.user_repo.get(review_data['user_id'])
+        user = self._get(self.user_repo, review_data['user_id'])
         if not user:
             raise ValueError("User not found")
 
-        place = self.place_repo.get(review_data['place_id'])
+        place = self._get(self.place_repo, review_data['place_id'])
         if not place:
             raise ValueError("Place not found")
 
@@ -216,7 +450,16 @@ class HBnBFacade:
             rating=review_data['rating'],
             text=review_data['comment']
             )
-        self.review_repo.add(review)
+        try:
+            # The unique (user_id, place_id) index rejects a second review atomically
+            with self.transaction():
+                self.review_repo.add(review)
+                self.place_repo.apply_rating_delta(place.id, 1, review.rating)
+        except IntegrityError as e:
+            if not _is_duplicate_review(e):
+                raise
+            raise ValueError("Vous avez déjà évalué ce lieu")
+        self._reviews_changed(place.id)
         return review
     
     def get_review(self, review_id):
@@ -225,31 +468,63 @@ class HBnBFacade:
     def get_all_reviews(self):
         return self.review_repo.get_all()
 
-    def get_reviews_by_place(self, place_id):
-        return [r for r in self.review_repo.get_all() if r.place_id == place_id]
+    def get_reviews_page(self, limit, cursor=None, columns=None):
+        return self.review_repo.get_page(limit, cursor, columns=columns)
+
+    def iter_all_reviews(self, batch_size=1000):
+        """Stream every review, for exports and batch jobs"""
+        return self.review_repo.iter_all(batch_size)
+
+    def get_reviews_by_place(self, place_id, limit=None, cursor=None, sort='newest', columns=None):
+        """Reviews of one place, sorted 'newest' or by 'rating', and the next page cursor"""
+        return self.review_repo.get_reviews_by_place(place_id, limit, cursor, sort, columns=columns)
 
     def update_review(self, review_id, review_data):
         review = self.review_repo.get(review_id)
         if not review:
             return None
 
+        previous_rating = review.rating
         if 'rating' in review_data:
             review.rating = review_data['rating']
         if 'comment' in review_data:
-            review.comment = review_data['comment']
+            review.text = review_data['comment']
 
-        self.review_repo.update(review_id, {
-            "rating": review.rating,
-            "comment": review.comment
-        })
+        with self.transaction():
+            self.review_repo.update(review_id, {
+                "rating": review.rating,
+                "text": review.text
+            })
+            if review.rating != previous_rating:
+                self.place_repo.apply_rating_delta(review.place_id, 0, review.rating - previous_rating)
+        self._reviews_changed(review.place_id, review_id)
         return review
     
     def get_review_by_user_and_place(self, user_id, place_id):
         """Returns the review if the user has already reviewed the given place"""
-        for review in self.review_repo.get_all():
-            if review.user_id == user_id and review.place_id == place_id:
-                return review
-        return None
+        return self.review_repo.get_by_user_and_place(user_id, place_id)
 
     def delete_review(self, review_id):
-        return self.review_repo.delete(review_id)
+        review = self.review_repo.get(review_id)
+        if not review:
+            return None
+        with self.transaction():
+            self.review_repo.delete(review_id)
+            self.place_repo.apply_rating_delta(review.place_id, -1, -review.rating)
+        self._reviews_changed(review.place_id, review_id)
+        return True
+
+    def _reviews_changed(self, place_id, review_id=None):
+        """Stale the cached responses showing the reviews or rating of a place"""
+        tags = ['places', f'place:{place_id}', f'place_reviews:{place_id}']
+        if review_id:
+            tags.append(f'review:{review_id}')
+        response_cache.invalidate(*tags)
+
+    def get_places_by_rating(self, min_rating=None, limit=None, cursor=None, columns=None):
+        """Places rated at least min_rating, best rated first"""
+        return self.place_repo.get_by_rating(min_rating, limit, cursor, columns)
+
+    def reconcile_ratings(self):
+        """Fix the place rating aggregates that drifted from the reviews, return how many were fixed"""
+        return self.place_repo.reconcile_ratings()
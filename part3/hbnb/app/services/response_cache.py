@@ -0,0 +1,178 @@
+"""Response cache for the public GET endpoints.
+
+Entries are tagged with the entities they were built from ('places',
+'place:<id>', ...). Each tag has a version counter: the facade bumps it after a
+write, and an entry stored under older versions is a miss. Nothing has to
+enumerate the entries of a tag.
+"""
+import json
+import sqlite3
+import threading
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import request
+
+from app.persistence.cache import LRUCache
+
+
+class LocalBackend:
+    """In-process LRU, private to one worker: invalidations do not reach the other workers.
+
+    At most max_tags tag versions are kept. When a new tag would exceed that, all of them
+    restart from above any version handed out so far, which stales every entry at once.
+    """
+
+    def __init__(self, maxsize=1024, max_tags=8192):
+        self._entries = LRUCache(maxsize=maxsize)
+        self._versions = {}
+        self._max_tags = max_tags
+        # Version of the tags not in _versions
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, entry, ttl):
+        self._entries.set(key, entry, ttl)
+
+    def version(self, tag):
+        return self._versions.get(tag, self._floor)
+
+    def bump(self, tag):
+        with self._lock:
+            if tag not in self._versions and len(self._versions) >= self._max_tags:
+                self._floor = max(self._versions.values()) + 1
+                self._versions.clear()
+                self._entries.clear()
+            self._versions[tag] = self._versions.get(tag, self._floor) + 1
+
+    def stats(self):
+        return self._entries.stats()
+
+
+class SQLiteBackend:
+    """Entries and tag versions in a SQLite file, shared by every worker of the host"""
+    PURGE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+        connection.execute("CREATE TABLE IF NOT EXISTS tags (tag TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute("SELECT value FROM entries WHERE key = ? AND expires > ?",
+                                         (key, time.time())).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, entry, ttl):
+        connection = self._connection()
+        connection.execute("INSERT OR REPLACE INTO entries (key, value, expires) VALUES (?, ?, ?)",
+                           (key, json.dumps(entry, default=str), time.time() + ttl))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            connection.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+
+    def version(self, tag):
+        row = self._connection().execute("SELECT version FROM tags WHERE tag = ?", (tag,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, tag):
+        self._connection().execute("INSERT INTO tags (tag, version) VALUES (?, 1) "
+                                   "ON CONFLICT (tag) DO UPDATE SET version = version + 1", (tag,))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+class ResponseCache:
+    def __init__(self):
+        self.backend = None
+        self.default_ttl = 60
+
+    def init_app(self, app):
+        """Pick the backend from RESPONSE_CACHE_BACKEND: 'local', 'sqlite' or None (disabled)"""
+        kind = app.config.get('RESPONSE_CACHE_BACKEND', 'local')
+        if kind == 'local':
+            self.backend = LocalBackend(app.config.get('RESPONSE_CACHE_SIZE', 1024),
+                                        app.config.get('RESPONSE_CACHE_TAGS', 8192))
+        elif kind == 'sqlite':
+            self.backend = SQLiteBackend(app.config.get('RESPONSE_CACHE_PATH', 'response_cache.db'))
+        elif kind is None:
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown response cache backend: {kind}")
+        self.default_ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+
+    def invalidate(self, *tags):
+        """Make every entry tagged with one of tags stale; call once the write is committed"""
+        if self.backend is not None:
+            for tag in tags:
+                self.backend.bump(tag)
+
+    def stats(self):
+        return self.backend.stats() if self.backend is not None else {}
+
+    @staticmethod
+    def _key(view):
+        args = urlencode(sorted(request.args.items(multi=True)))
+        return f"{view.__module__}.{view.__qualname__}:{request.path}?{args}"
+
+    def cached(self, ttl=None, tags=None):
+        """Cache the 200 responses of an unauthenticated Resource GET.
+
+        tags(**view_kwargs) returns the tags of the response, ttl is in seconds
+        (RESPONSE_CACHE_TTL by default). A hit whose ETag is in If-None-Match is a 304.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(resource, *args, **kwargs):
+                if self.backend is None or request.method != 'GET' or 'Authorization' in request.headers:
+                    return view(resource, *args, **kwargs)
+                entry_tags = list(tags(**kwargs)) if tags else []
+                # Versions are read before the view runs: a write landing meanwhile makes the entry stale
+                versions = [self.backend.version(tag) for tag in entry_tags]
+                key = self._key(view)
+                entry = self.backend.get(key)
+                if entry is not None and entry['versions'] == versions:
+                    etag = entry['headers'].get('ETag')
+                    # The stored ETag answers a conditional GET without running the view at all
+                    if etag and request.if_none_match.contains_weak(etag.strip('"')):
+                        return '', 304, {'ETag': etag}
+                    return entry['body'], entry['status'], entry['headers']
+
+                result = view(resource, *args, **kwargs)
+                if not isinstance(result, tuple):
+                    result = (result,)
+                body = result[0]
+                status = result[1] if len(result) > 1 else 200
+                headers = result[2] if len(result) > 2 else {}
+                if status == 200:
+                    self.backend.set(key, {'body': body, 'status': status, 'headers': dict(headers or {}),
+                                           'versions': versions}, ttl or self.default_ttl)
+                return body, status, headers
+            return wrapper
+        return decorator
+
+
+response_cache = ResponseCache()
@@ -1,9 +1,40 @@
 #!/usr/bin/python3
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from app import create_app, db
 from app.models.amenity import Amenity
+from app.services import facade
 
 def test_amenity_creation():
     amenity = Amenity(name="Wi-Fi")
     assert amenity.name == "Wi-Fi"
     print("Amenity creation test passed!")
 
-test_amenity_creation()
\ No newline at end of file
+test_amenity_creation()
+
+def test_amenity_integrity_errors():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        wifi = facade.create_amenity({"name": "Wi-Fi"})
+        pool = facade.create_amenity({"name": "Pool"})
+        for call in (lambda: facade.create_amenity({"name": "WI-FI"}),
+                     lambda: facade.update_amenity(pool.id, {"name": "wi-fi"})):
+            try:
+                call()
+                assert False, "duplicate name accepted"
+            except ValueError as e:
+                assert str(e) == "Amenity with this name already exists"
+            db.session.rollback()
+        # Any other constraint failure is not reported as a duplicate
+        db.session.execute(text("CREATE TRIGGER amenities_frozen BEFORE INSERT ON amenities "
+                                "BEGIN SELECT RAISE(ABORT, 'amenities are frozen'); END"))
+        try:
+            facade.create_amenity({"name": "Sauna"})
+            assert False, "insert accepted"
+        except IntegrityError as e:
+            assert "amenities are frozen" in str(e.orig)
+        assert facade.get_amenity(wifi.id).name == "Wi-Fi"
+    print("Amenity integrity error test passed!")
+
+test_amenity_integrity_errors()
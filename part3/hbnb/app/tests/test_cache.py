@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+import time
+from flask import g
+from app import create_app, db
+from app.models.user import User
+from app.persistence.cache import LRUCache
+from app.persistence.repository import unit_of_work
+from app.services import facade
+from app.services.response_cache import LocalBackend, response_cache
+from config import TestingConfig
+
+class CachedConfig(TestingConfig):
+    RESPONSE_CACHE_BACKEND = 'local'
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+    cache.set("d", 4, ttl=0)
+    time.sleep(0.01)
+    assert cache.get("d") is None
+    print("LRU cache test passed!")
+
+test_lru_cache()
+
+def test_local_backend_tag_bound():
+    backend = LocalBackend(maxsize=8, max_tags=2)
+    backend.bump("place:1")
+    backend.set("a", {"versions": [backend.version("place:1")]}, 60)
+    backend.bump("place:1")
+    backend.bump("place:2")
+    # A third tag restarts the versions above every one seen: nothing stale can match again
+    backend.bump("place:3")
+    assert len(backend._versions) == 1 and backend.get("a") is None
+    assert backend.version("place:1") > 2 and backend.version("place:3") > backend.version("place:1")
+    print("Local backend tag bound test passed!")
+
+test_local_backend_tag_bound()
+
+def test_user_update_evicts_cached_get():
+    app = create_app(CachedConfig)
+    with app.app_context():
+        db.create_all()
+        owner = User(first_name="Ada", last_name="Lovelace", email="ada@example.com")
+        owner.hash_password("secret")
+        facade.user_repo.add(owner)
+        facade.create_place({"title": "Loft", "description": "Bright", "price": 80, "latitude": 48.8,
+                             "longitude": 2.3, "owner_id": owner.id})
+        client = app.test_client()
+        url = "/api/v1/places/?include=owner"
+        assert client.get(url).json[0]["owner"]["first_name"] == "Ada"
+        facade.update_user(owner.id, {"first_name": "Grace"})
+        assert client.get(url).json[0]["owner"]["first_name"] == "Grace"
+    print("User update cache eviction test passed!")
+
+test_user_update_evicts_cached_get()
+
+def test_place_detail_tags():
+    app = create_app(CachedConfig)
+    with app.app_context():
+        db.create_all()
+        owners = []
+        for first_name, email in (("Ada", "ada@example.com"), ("Alan", "alan@example.com")):
+            owner = User(first_name=first_name, last_name="Doe", email=email)
+            owner.hash_password("secret")
+            facade.user_repo.add(owner)
+            owners.append(owner)
+        wifi = facade.create_amenity({"name": "Wi-Fi"})
+        loft, flat = [facade.create_place({"title": title, "description": "Bright", "price": 80, "latitude": 48.8,
+                                           "longitude": 2.3, "owner_id": owner.id, "amenities": amenities})
+                      for title, owner, amenities in (("Loft", owners[0], [wifi.id]), ("Flat", owners[1], []))]
+        client = app.test_client()
+        urls = {place.id: f"/api/v1/places/{place.id}" for place in (loft, flat)}
+        for url in urls.values():
+            client.get(url)
+        versions = {place_id: response_cache.backend.version(f"place:{place_id}") for place_id in urls}
+        # Only the details showing the changed owner or amenity are staled
+        facade.update_user(owners[0].id, {"first_name": "Grace"})
+        assert client.get(urls[loft.id]).json["owner"]["first_name"] == "Grace"
+        facade.update_amenity(wifi.id, {"name": "Fibre"})
+        assert client.get(urls[loft.id]).json["amenities"][0]["name"] == "Fibre"
+        assert response_cache.backend.version(f"place:{flat.id}") == versions[flat.id]
+        assert response_cache.backend.version(f"place:{loft.id}") == versions[loft.id] + 2
+    print("Place detail cache tag test passed!")
+
+test_place_detail_tags()
+
+class RepositoryCacheConfig(TestingConfig):
+    REPOSITORY_CACHE_TTL = 60
+
+def test_repository_cache_config():
+    create_app("config.TestingConfig")
+    assert facade.user_repo.cache is None and facade.place_repo.cache is None
+    create_app(RepositoryCacheConfig)
+    assert facade.user_repo.cache.ttl == 60 and facade.amenity_repo.cache.maxsize == 4096
+    print("Repository cache config test passed!")
+
+test_repository_cache_config()
+
+def test_repository_evicts_after_commit():
+    app = create_app(RepositoryCacheConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(first_name="Ada", last_name="Lovelace", email="ada@example.com")
+        user.hash_password("secret")
+        facade.user_repo.add(user)
+        cache = facade.user_repo.cache
+        with unit_of_work():
+            facade.user_repo.update(user.id, {"first_name": "Grace"})
+            # A concurrent get() caching the committed row before this transaction commits...
+            cache.set(user.id, {"id": user.id, "first_name": "Ada"})
+        # ...is evicted by the commit, not served afterwards
+        assert cache.get(user.id) is None
+
+        try:
+            with unit_of_work():
+                facade.user_repo.update(user.id, {"first_name": "Alan"})
+                cache.set(user.id, {"id": user.id, "first_name": "Alan"})
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        assert cache.get(user.id) is None
+        db.session.expunge_all()
+        assert facade.user_repo.get(user.id).first_name == "Grace"
+    print("Repository cache eviction test passed!")
+
+test_repository_evicts_after_commit()
+
+def test_facade_memo_scope():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        user = User(first_name="Ada", last_name="Lovelace", email="ada@example.com")
+        user.hash_password("secret")
+        facade.user_repo.add(user)
+        # A bare app context (scripts, CLI) is not memoized, it could outlive any write
+        facade._get(facade.user_repo, user.id)
+        assert "_facade_memo" not in g
+        with app.test_request_context():
+            assert facade._get(facade.user_repo, user.id) is facade._get(facade.user_repo, user.id)
+            assert ("User", user.id) in g._facade_memo
+    print("Facade memo scope test passed!")
+
+test_facade_memo_scope()
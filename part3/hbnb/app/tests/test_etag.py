@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+from app import create_app, db
+from app.models.place import Place
+from app.models.user import User
+from app.services import facade
+from config import TestingConfig
+
+class CachedConfig(TestingConfig):
+    RESPONSE_CACHE_BACKEND = 'local'
+
+def seed():
+    """An owner with one place, and one amenity; returns (owner id, amenity id)"""
+    owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+    owner.hash_password("secret")
+    place = Place(title="Flat", description="A nice place", price=50, latitude=0, longitude=0, owner=owner)
+    db.session.add_all([owner, place])
+    db.session.commit()
+    amenity = facade.create_amenity({"name": "Wi-Fi"})
+    return owner.id, amenity.id
+
+def test_list_etags():
+    for config in ("config.TestingConfig", CachedConfig):
+        app = create_app(config)
+        with app.app_context():
+            db.create_all()
+            owner_id, amenity_id = seed()
+            client = app.test_client()
+            for url in ("/api/v1/amenities/", "/api/v1/places/", "/api/v1/places/?include=owner"):
+                response = client.get(url)
+                etag = response.headers["ETag"]
+                assert response.status_code == 200 and etag.startswith('"'), url
+                # The client's copy is current: 304, no body, same tag
+                response = client.get(url, headers={"If-None-Match": etag})
+                assert response.status_code == 304 and response.data == b"" and response.headers["ETag"] == etag, url
+                assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200, url
+
+            # A different representation of the same rows gets another tag
+            assert (client.get("/api/v1/places/?fields=id").headers["ETag"]
+                    != client.get("/api/v1/places/?fields=id,title").headers["ETag"])
+
+            # Writes move the tags of the lists they show up in
+            before = {url: client.get(url).headers["ETag"] for url in ("/api/v1/amenities/", "/api/v1/places/?include=owner")}
+            facade.update_amenity(amenity_id, {"name": "Wifi"})
+            facade.update_user(owner_id, {"first_name": "Alicia"})
+            for url, etag in before.items():
+                response = client.get(url, headers={"If-None-Match": etag})
+                assert response.status_code == 200 and response.headers["ETag"] != etag, (config, url)
+    print("List ETag test passed!")
+
+test_list_etags()
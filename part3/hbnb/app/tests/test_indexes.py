@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+from datetime import datetime
+from sqlalchemy import event, text
+from app import create_app, db
+from app.persistence.repository import encode_cursor
+from app.services import facade
+from migrate import index_names, migrate
+
+# Query -> indexes the planner may pick, any index led by the filtered column will do
+QUERIES = {
+    "SELECT id FROM places WHERE user_id = 'x'": ("ix_places_user_id",),
+    "SELECT id FROM reviews WHERE place_id = 'x'": ("ix_reviews_place_created_id", "ix_reviews_place_rating_id"),
+    "SELECT id FROM reviews WHERE user_id = 'x'": ("uq_reviews_user_place",),
+    "SELECT place_id FROM place_amenity WHERE amenity_id = 'x'": ("ix_place_amenity_amenity_place",),
+}
+
+def plan(query):
+    rows = db.session.execute(text("EXPLAIN QUERY PLAN " + query)).all()
+    return " ".join(row[-1] for row in rows)
+
+def test_indexes():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        # An older database without the indexes gets them back from the migration
+        db.session.execute(text("DROP INDEX ix_places_user_id"))
+        db.session.execute(text("DROP INDEX ix_place_amenity_amenity_place"))
+        # Superseded indexes are dropped
+        db.session.execute(text("CREATE INDEX ix_reviews_place_created ON reviews (place_id, created_at)"))
+        db.session.execute(text("CREATE INDEX ix_users_created_at ON users (created_at)"))
+        db.session.commit()
+        assert migrate() == ["ix_place_amenity_amenity_place", "ix_places_user_id"]
+        assert migrate() == []
+        assert not {"ix_reviews_place_created", "ix_users_created_at"} & index_names()
+
+        for query, indexes in QUERIES.items():
+            assert any(index in plan(query) for index in indexes), (query, plan(query))
+    print("Index test passed!")
+
+test_indexes()
+
+def test_keyset_plans():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        statements = []
+        listener = lambda conn, cursor, statement, params, context, many: statements.append((statement, params))
+        event.listen(db.engine, "before_cursor_execute", listener)
+        pages = (
+            ("amenities", lambda: facade.get_amenities_page(10, encode_cursor([datetime(2024, 1, 1), "x"]), columns=("id",))),
+            ("places", lambda: facade.get_places_by_price(None, 100, 10, encode_cursor([50.0, "x"]), columns=("id",))),
+            ("places", lambda: facade.get_places_by_rating(None, 10, encode_cursor([4.5, "x"]), columns=("id",))),
+            ("reviews", lambda: facade.review_repo.get_reviews_by_place("p", 10, encode_cursor([datetime(2024, 1, 1), "x"]), columns=("id",))),
+            ("reviews", lambda: facade.review_repo.get_reviews_by_place("p", 10, encode_cursor([4, datetime(2024, 1, 1), "x"]), sort="rating", columns=("id",))),
+        )
+        for table, page in pages:
+            statements.clear()
+            page()
+            statement, params = statements[-1]
+            rows = db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, params).all()
+            query_plan = " ".join(row[-1] for row in rows)
+            # The cursor seeks into the index instead of scanning it and sorting
+            assert f"SEARCH {table}" in query_plan and "TEMP B-TREE" not in query_plan, query_plan
+        event.remove(db.engine, "before_cursor_execute", listener)
+    print("Keyset plan test passed!")
+
+test_keyset_plans()
@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+import gzip
+from app.middleware import CompressionMiddleware
+
+LINES = [b'{"id": %d, "text": "A nice stay"}\n' % i for i in range(200)]
+
+def ndjson_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'application/x-ndjson'), ('ETag', '"v1"')])
+    return iter(LINES)
+
+def call(app, accept_encoding):
+    response = {}
+    def start_response(status, headers, exc_info=None):
+        response['status'], response['headers'] = status, dict(headers)
+    body = b''.join(app({'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': accept_encoding}, start_response))
+    return response['headers'], body
+
+def test_gzip_stream():
+    app = CompressionMiddleware(ndjson_app, level=6, min_size=500)
+    headers, body = call(app, 'gzip, deflate')
+    assert headers['Content-Encoding'] == 'gzip' and headers['Vary'] == 'Accept-Encoding'
+    assert headers['ETag'] == '"v1-gzip"'
+    assert gzip.decompress(body) == b''.join(LINES)
+
+    headers, body = call(app, 'identity')
+    assert 'Content-Encoding' not in headers and body == b''.join(LINES)
+    print("Gzip stream compression test passed!")
+
+test_gzip_stream()
+
+def test_small_body():
+    app = CompressionMiddleware(ndjson_app, min_size=10 ** 6)
+    headers, body = call(app, 'gzip')
+    assert 'Content-Encoding' not in headers and body == b''.join(LINES)
+    assert headers['Content-Length'] == str(len(body))
+    print("Small body test passed!")
+
+test_small_body()
@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+from app import create_app, db
+
+def test_limit_validation():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        for limit in ("abc", "-1", "0", "1.5"):
+            response = client.get(f"/api/v1/amenities/?limit={limit}")
+            assert response.status_code == 400, limit
+            assert response.json == {"error": "limit must be a positive integer"}
+        assert client.get("/api/v1/amenities/?limit=5").status_code == 200
+        assert client.get("/api/v1/amenities/").status_code == 200
+    print("Pagination limit validation test passed!")
+
+test_limit_validation()
+
+def test_filter_validation():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        for name in ("min_price", "max_price", "min_rating"):
+            for value in ("abc", "", "nan"):
+                response = client.get(f"/api/v1/places/?{name}={value}")
+                assert response.status_code == 400, (name, value)
+                assert response.json == {"error": f"{name} must be a number"}
+        assert client.get("/api/v1/places/?min_price=10&max_price=99.5").status_code == 200
+        assert client.get("/api/v1/places/?min_rating=3").status_code == 200
+    print("Place filter validation test passed!")
+
+test_filter_validation()
+
+def test_radius_validation():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        response = client.get("/api/v1/places/search?near=48.85,2.35&radius_km=abc")
+        assert response.status_code == 400
+        assert response.json == {"error": "radius_km must be a number"}
+        for radius in ("0", "501", "inf"):
+            assert client.get(f"/api/v1/places/search?near=48.85,2.35&radius_km={radius}").status_code == 400
+        assert client.get("/api/v1/places/search?near=48.85,2.35&radius_km=5").status_code == 200
+        assert client.get("/api/v1/places/search?near=48.85,2.35").status_code == 200
+    print("Search radius validation test passed!")
+
+test_radius_validation()
@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+from sqlalchemy import text
+from app import create_app, db
+from app.models.amenity import Amenity
+from app.models.place import Place
+from app.models.user import User
+from app.persistence import geo
+from app.persistence.place_repository import InMemoryPlaceRepository
+from app.services import facade
+
+def test_price_range():
+    owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+    repo = InMemoryPlaceRepository()
+    for price in (120, 80, 100, 60, 100):
+        repo.add(Place(title="Flat", description="A nice place", price=price, latitude=0, longitude=0, owner=owner))
+
+    places, next_cursor = repo.get_by_price_range(70, 110, limit=2)
+    assert [place.price for place in places] == [80, 100]
+    places, next_cursor = repo.get_by_price_range(70, 110, limit=2, cursor=next_cursor)
+    assert [place.price for place in places] == [100]
+    assert next_cursor is None
+    print("Place price range test passed!")
+
+test_price_range()
+
+def test_failed_update_keeps_indexes():
+    owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+    repo = InMemoryPlaceRepository()
+    place = Place(title="Flat", description="A nice place", price=100, latitude=0, longitude=0, owner=owner)
+    repo.add(place)
+
+    # Rejected by the model: the place stays findable under its current values
+    for data in ({'price': -1}, place):
+        try:
+            repo.update(place.id, data)
+            assert False, "invalid update accepted"
+        except (ValueError, TypeError):
+            pass
+        assert place.price == 100
+        assert repo.get_by_price_range(100, 100)[0] == [place]
+        assert repo.find_all_by_attribute('user_id', owner.id) == [place]
+    print("Place failed update test passed!")
+
+test_failed_update_keeps_indexes()
+
+def test_bbox_search():
+    owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+    repo = InMemoryPlaceRepository()
+    for title, latitude, longitude in (("Paris", 48.8566, 2.3522), ("Versailles", 48.8049, 2.1204), ("Lyon", 45.764, 4.8357)):
+        repo.add(Place(title=title, description="A nice place", price=50, latitude=latitude, longitude=longitude, owner=owner))
+
+    places = repo.get_in_bbox(48.5, 2.0, 49.0, 2.5)
+    ranked = geo.rank_by_distance(places, 48.85, 2.35, radius_km=25)
+    assert [place.title for place, distance in ranked] == ["Paris", "Versailles"]
+    print("Place bbox search test passed!")
+
+test_bbox_search()
+
+def test_text_search():
+    owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+    repo = InMemoryPlaceRepository()
+    for title, description in (("Cozy loft", "Near the sea"), ("Sea view", "Flat with a sea view"), ("Chalet", "Mountain café")):
+        repo.add(Place(title=title, description=description, price=50, latitude=0, longitude=0, owner=owner))
+
+    places, next_cursor = repo.search_text("sea", limit=1)
+    assert [place.title for place in places] == ["Sea view"]
+    places, next_cursor = repo.search_text("sea", limit=1, cursor=next_cursor)
+    assert [place.title for place in places] == ["Cozy loft"] and next_cursor is None
+    assert [place.title for place in repo.search_text("cafe", limit=10)[0]] == ["Chalet"]
+    print("Place text search test passed!")
+
+test_text_search()
+
+def test_amenity_facets():
+    owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+    wifi, pool = Amenity(name="Wi-Fi"), Amenity(name="Pool")
+    repo = InMemoryPlaceRepository()
+    for title, amenities in (("Both", [wifi, pool]), ("Wifi only", [wifi]), ("None", [])):
+        place = Place(title=title, description="A nice place", price=50, latitude=0, longitude=0, owner=owner)
+        for amenity in amenities:
+            place.add_amenity(amenity)
+        repo.add(place)
+
+    places, next_cursor, total = repo.find_by_amenities(all_of=[wifi.id], none_of=[pool.id], limit=10)
+    assert [place.title for place in places] == ["Wifi only"] and total == 1
+    assert repo.amenity_facets(any_of=[wifi.id, pool.id]) == {wifi.id: 2, pool.id: 1}
+    print("Place amenity facets test passed!")
+
+test_amenity_facets()
+
+def test_amenity_index_rebuild():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+        owner.hash_password("secret")
+        wifi = Amenity(name="Wi-Fi")
+        place = Place(title="Flat", description="A nice place", price=50, latitude=0, longitude=0, owner=owner)
+        db.session.add_all([owner, wifi, place])
+        db.session.commit()
+        repo = facade.place_repo
+        repo.AMENITY_INDEX_CHECK = 0
+        try:
+            assert repo.find_by_amenities(all_of=[wifi.id])[2] == 0
+            # Another worker links the amenity: none of this process's flush events see it
+            db.session.execute(text("INSERT INTO place_amenity (place_id, amenity_id) VALUES (:place, :amenity)"),
+                               {"place": place.id, "amenity": wifi.id})
+            db.session.commit()
+            assert repo.find_by_amenities(all_of=[wifi.id])[2] == 1
+        finally:
+            del repo.AMENITY_INDEX_CHECK
+    print("Place amenity index rebuild test passed!")
+
+test_amenity_index_rebuild()
+
+def test_version():
+    owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+    wifi = Amenity(name="Wi-Fi")
+    repo = InMemoryPlaceRepository()
+    place = Place(title="Flat", description="A nice place", price=50, latitude=0, longitude=0, owner=owner)
+    repo.add(place)
+
+    version = repo.get_version(place.id)
+    assert version == repo.get_version(place.id)
+    place.add_amenity(wifi)
+    assert repo.get_version(place.id) != version
+    assert repo.get_version("unknown") is None
+    print("Place version test passed!")
+
+test_version()
+
+def test_amenity_rows():
+    owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+    wifi, pool = Amenity(name="Wi-Fi"), Amenity(name="Pool")
+    repo = InMemoryPlaceRepository()
+    place = Place(title="Flat", description="A nice place", price=50, latitude=0, longitude=0, owner=owner)
+    place.add_amenity(wifi)
+    place.add_amenity(pool)
+    repo.add(place)
+
+    assert repo.get_amenity_rows([place.id, "unknown"], ("name",)) == {place.id: [{"name": "Pool"}, {"name": "Wi-Fi"}],
+                                                                       "unknown": []}
+    assert repo.get_many([place.id], columns=("title",)) == [{"id": place.id, "title": "Flat"}]
+    print("Place amenity rows test passed!")
+
+test_amenity_rows()
+
+def test_sql_price_range():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+        owner.hash_password("secret")
+        db.session.add(owner)
+        for price in (120, 80, 100, 60, 100):
+            db.session.add(Place(title="Flat", description="A nice place", price=price, latitude=0, longitude=0, owner=owner))
+        db.session.commit()
+
+        # The hybrid property filters in SQL on the mapped price column
+        assert sorted(place.price for place in Place.query.filter(Place.price >= 100)) == [100, 100, 120]
+        places, next_cursor = facade.get_places_by_price(70, 110, limit=2)
+        assert [place.price for place in places] == [80, 100]
+        places, next_cursor = facade.get_places_by_price(70, 110, limit=2, cursor=next_cursor)
+        assert [place.price for place in places] == [100] and next_cursor is None
+        rows, next_cursor = facade.get_places_by_price(max_price=80, limit=10, columns=("id", "price"))
+        assert [row["price"] for row in rows] == [60, 80] and next_cursor is None
+    print("Place SQL price range test passed!")
+
+test_sql_price_range()
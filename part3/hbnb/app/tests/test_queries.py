@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import selectinload
+from app import create_app, db
+from app.models.amenity import Amenity
+from app.models.place import Place
+from app.models.user import User
+from app.services import facade
+
+@contextmanager
+def recorded_statements():
+    statements = []
+    listener = lambda conn, cursor, statement, params, context, many: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+def seed_places(amenity_counts):
+    """One owner and a place per entry of amenity_counts, with that many amenities; returns the place ids"""
+    owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+    owner.hash_password("secret")
+    amenities = [Amenity(name=f"Amenity {i}") for i in range(max(amenity_counts))]
+    places = []
+    for count in amenity_counts:
+        place = Place(title="Flat", description="A nice place", price=50, latitude=0, longitude=0, owner=owner)
+        for amenity in amenities[:count]:
+            place.add_amenity(amenity)
+        places.append(place)
+    db.session.add_all([owner, *amenities, *places])
+    db.session.commit()
+    return [place.id for place in places]
+
+def test_place_detail_queries():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        small, large = seed_places([1, 10])
+        client = app.test_client()
+        counts = {}
+        for place_id in (small, large):
+            db.session.expunge_all()
+            with recorded_statements() as statements:
+                response = client.get(f"/api/v1/places/{place_id}")
+            assert response.status_code == 200
+            counts[place_id] = len(statements)
+        # Version, place, owner, amenities: as many queries for 10 amenities as for 1
+        assert len(response.json["amenities"]) == 10
+        assert counts[small] == counts[large] == 4, counts
+        db.session.expunge_all()
+        with recorded_statements() as statements:
+            assert client.get(f"/api/v1/places/{large}?reviews=5").status_code == 200
+        # The latest reviews are one more query
+        assert len(statements) == 5, statements
+    print("Place detail query count test passed!")
+
+test_place_detail_queries()
+
+def test_relationship_loading():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        place_id, = seed_places([3])
+        db.session.expunge_all()
+        # Nothing is loaded unless asked for: with SQLALCHEMY_RAISELOAD a lazy load raises
+        place = facade.place_repo.get(place_id)
+        try:
+            place.amenities
+            assert False, "amenities were lazy loaded"
+        except InvalidRequestError:
+            pass
+        db.session.expunge_all()
+        with recorded_statements() as statements:
+            place = facade.place_repo.get(place_id, options=(selectinload(Place.amenities),))
+            assert len(place.amenities) == 3
+        assert len(statements) == 2
+
+        with recorded_statements() as statements:
+            assert app.test_client().get("/api/v1/places/").status_code == 200
+        assert not any("place_amenity" in statement for statement in statements)
+    print("Relationship loading test passed!")
+
+test_relationship_loading()
+
+def test_list_projection():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        seed_places([2, 0])
+        db.session.expunge_all()
+        with recorded_statements() as statements:
+            users, _ = facade.get_users_page(10, columns=("id", "first_name", "last_name", "email"))
+        # Only the listed columns are read: the bcrypt hash stays in the database
+        assert users[0]["email"] == "alice.smith@example.com" and "password" not in users[0]
+        assert "password" not in statements[0]
+
+        with recorded_statements() as statements:
+            response = app.test_client().get("/api/v1/places/")
+        assert response.status_code == 200 and len(response.json) == 2
+        assert set(response.json[0]) == {"id", "title", "latitude", "longitude", "review_count", "rating_avg"}
+        assert len(statements) == 1 and "places.description" not in statements[0]
+        assert not db.session.identity_map, "projected rows were hydrated into entities"
+    print("List projection test passed!")
+
+test_list_projection()
@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+from sqlalchemy import event
+from app import create_app, db
+from app.models.amenity import Amenity
+from app.persistence.amenity_repository import AmenityRepository
+from app.persistence.repository import unit_of_work
+
+def test_unit_of_work():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        repo = AmenityRepository()
+        commits = []
+        listener = lambda session: commits.append(session)
+        event.listen(db.session, "after_commit", listener)
+
+        # Writes inside the block are committed together, once, on exit
+        with unit_of_work():
+            repo.add(Amenity(name="Wi-Fi"))
+            with unit_of_work():
+                repo.add(Amenity(name="Pool"))
+            assert commits == []
+        event.remove(db.session, "after_commit", listener)
+        assert len(commits) == 1
+        assert sorted(amenity.name for amenity in repo.get_all()) == ["Pool", "Wi-Fi"]
+
+        # An exception rolls the whole block back, nested writes included
+        try:
+            with unit_of_work():
+                repo.add(Amenity(name="Sauna"))
+                with unit_of_work():
+                    repo.add(Amenity(name="Gym"))
+                raise RuntimeError("abort")
+        except RuntimeError:
+            pass
+        assert sorted(amenity.name for amenity in repo.get_all()) == ["Pool", "Wi-Fi"]
+        assert db.session.info["uow_depth"] == 0
+    print("Unit of work test passed!")
+
+test_unit_of_work()
+
+def test_get_many():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        repo = AmenityRepository()
+        amenities = [Amenity(name=f"Amenity {i}") for i in range(5)]
+        repo.add_many(amenities)
+        ids = [amenity.id for amenity in amenities]
+
+        statements = []
+        listener = lambda conn, cursor, statement, params, context, many: statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", listener)
+        repo.IN_CHUNK_SIZE = 2
+        try:
+            # Caller's order, duplicates once, unknown ids skipped, one IN (...) query per chunk of ids
+            found = repo.get_many([ids[3], ids[0], "missing", ids[3], ids[4], ids[1]])
+            assert [amenity.id for amenity in found] == [ids[3], ids[0], ids[4], ids[1]]
+            assert len(statements) == 3
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        rows = repo.get_many(ids[:2], columns=("name",))
+        assert rows == [{"id": ids[0], "name": "Amenity 0"}, {"id": ids[1], "name": "Amenity 1"}]
+    print("Repository get_many test passed!")
+
+test_get_many()
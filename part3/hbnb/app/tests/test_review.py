@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+import sqlite3
+from datetime import datetime, timedelta
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError
+from app import create_app, db
+from app.models.place import Place
+from app.models.review import Review
+from app.models.user import User
+from app.services import facade
+from app.services.facade import _is_duplicate_review
+
+def test_duplicate_review():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+        guest = User(first_name="Bob", last_name="Martin", email="bob.martin@example.com")
+        for user in (owner, guest):
+            user.hash_password("secret")
+        place = Place(title="Flat", description="A nice place", price=50, latitude=0, longitude=0, owner=owner)
+        db.session.add_all([owner, guest, place])
+        db.session.commit()
+
+        review_data = {"user_id": guest.id, "place_id": place.id, "rating": 4, "comment": "Great"}
+        facade.create_review(review_data)
+        try:
+            facade.create_review(dict(review_data, rating=2))
+            assert False, "a second review of the same place was accepted"
+        except ValueError as e:
+            assert str(e) == "Vous avez déjà évalué ce lieu"
+        # The rejected review left the aggregates alone
+        db.session.refresh(place)
+        assert place.review_count == 1 and place.rating_sum == 4
+    print("Duplicate review test passed!")
+
+test_duplicate_review()
+
+def test_other_integrity_errors():
+    duplicate = IntegrityError("INSERT", {}, sqlite3.IntegrityError(
+        "UNIQUE constraint failed: reviews.user_id, reviews.place_id"))
+    not_null = IntegrityError("INSERT", {}, sqlite3.IntegrityError("NOT NULL constraint failed: reviews.rating"))
+    assert _is_duplicate_review(duplicate)
+    assert not _is_duplicate_review(not_null)
+    print("Review integrity error test passed!")
+
+test_other_integrity_errors()
+
+def test_reviews_by_place():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+        owner.hash_password("secret")
+        place = Place(title="Flat", description="A nice place", price=50, latitude=0, longitude=0, owner=owner)
+        other = Place(title="Loft", description="Another place", price=70, latitude=0, longitude=0, owner=owner)
+        db.session.add_all([owner, place, other])
+        start = datetime(2024, 1, 1)
+        for i, (rated, rating) in enumerate(((place, 3), (place, 5), (place, 4), (other, 1))):
+            guest = User(first_name="Guest", last_name=str(i), email=f"guest{i}@example.com")
+            guest.hash_password("secret")
+            review = Review(text="Nice", place=rated, rating=rating, user=guest)
+            review.created_at = start + timedelta(days=i)
+            db.session.add_all([guest, review])
+        db.session.commit()
+        place_id = place.id
+
+        statements = []
+        listener = lambda conn, cursor, statement, params, context, many: statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", listener)
+        # Newest first, one page per query, the other place's review never read
+        reviews, next_cursor = facade.get_reviews_by_place(place_id, limit=2)
+        assert [review.rating for review in reviews] == [4, 5] and len(statements) == 1
+        reviews, next_cursor = facade.get_reviews_by_place(place_id, limit=2, cursor=next_cursor)
+        assert [review.rating for review in reviews] == [3] and next_cursor is None
+        event.remove(db.engine, "before_cursor_execute", listener)
+        assert "reviews.place_id = ?" in statements[0]
+
+        rows, _ = facade.get_reviews_by_place(place_id, limit=10, sort="rating", columns=("id", "rating"))
+        assert [row["rating"] for row in rows] == [5, 4, 3]
+        response = app.test_client().get(f"/api/v1/reviews/places/{place_id}/reviews?limit=2")
+        assert response.status_code == 200 and len(response.json) == 2 and "Link" in response.headers
+    print("Reviews by place test passed!")
+
+test_reviews_by_place()
+
+def test_rating_aggregates():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        owner = User(first_name="Alice", last_name="Smith", email="alice.smith@example.com")
+        owner.hash_password("secret")
+        places = [Place(title=title, description="A nice place", price=50, latitude=0, longitude=0, owner=owner)
+                  for title in ("Good", "Best", "Unrated")]
+        guests = [User(first_name="Guest", last_name=str(i), email=f"guest{i}@example.com") for i in range(2)]
+        for guest in guests:
+            guest.hash_password("secret")
+        db.session.add_all([owner, *places, *guests])
+        db.session.commit()
+        good, best, unrated = [place.id for place in places]
+        first, second = [guest.id for guest in guests]
+
+        def rating(place_id):
+            row = facade.place_repo.get_many([place_id], columns=("review_count", "rating_sum", "rating_avg"))[0]
+            return row["review_count"], row["rating_sum"], row["rating_avg"]
+
+        review = facade.create_review({"user_id": first, "place_id": good, "rating": 2, "comment": "Fine"})
+        facade.create_review({"user_id": second, "place_id": good, "rating": 4, "comment": "Good"})
+        facade.create_review({"user_id": first, "place_id": best, "rating": 5, "comment": "Great"})
+        assert rating(good) == (2, 6, 3.0) and rating(best) == (1, 5, 5.0) and rating(unrated) == (0, 0, 0.0)
+        facade.update_review(review.id, {"rating": 3})
+        assert rating(good) == (2, 7, 3.5)
+
+        # Best rated first, then unrated; min_rating keeps the rated ones
+        rows, _ = facade.get_places_by_rating(limit=10, columns=("id",))
+        assert [row["id"] for row in rows] == [best, good, unrated]
+        rows, next_cursor = facade.get_places_by_rating(min_rating=3.5, limit=1, columns=("id",))
+        assert [row["id"] for row in rows] == [best]
+        rows, next_cursor = facade.get_places_by_rating(min_rating=3.5, limit=1, cursor=next_cursor, columns=("id",))
+        assert [row["id"] for row in rows] == [good] and next_cursor is None
+
+        assert facade.delete_review(review.id) is True
+        assert rating(good) == (1, 4, 4.0)
+        # Drift written behind the facade's back is repaired from the reviews
+        db.session.execute(text("UPDATE places SET review_count = 9, rating_sum = 1, rating_avg = 0.1 WHERE id = :id"),
+                           {"id": best})
+        db.session.commit()
+        assert facade.reconcile_ratings() == 1 and rating(best) == (1, 5, 5.0)
+    print("Rating aggregates test passed!")
+
+test_rating_aggregates()
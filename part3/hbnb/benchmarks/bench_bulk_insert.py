@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+"""
+Compare row-by-row repository inserts with the bulk add_many path
+
+Usage: python -m benchmarks.bench_bulk_insert [rows ...]   (default: 10000 100000)
+"""
+import os
+import sys
+import tempfile
+import time
+
+from app import create_app, db
+from app.models.amenity import Amenity
+from app.persistence.amenity_repository import AmenityRepository
+
+
+class BenchConfig:
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+
+def make_amenities(count, prefix):
+    return [Amenity(name=f"{prefix}-{i}") for i in range(count)]
+
+
+def bench_one_by_one(repo, count):
+    amenities = make_amenities(count, 'single')
+    start = time.perf_counter()
+    for amenity in amenities:
+        repo.add(amenity)
+    return time.perf_counter() - start
+
+
+def bench_add_many(repo, count):
+    amenities = make_amenities(count, 'bulk')
+    start = time.perf_counter()
+    repo.add_many(amenities)
+    return time.perf_counter() - start
+
+
+def run(count):
+    """Time both paths against a fresh file-backed SQLite database"""
+    results = {}
+    for name, bench in (('add', bench_one_by_one), ('add_many', bench_add_many)):
+        with tempfile.TemporaryDirectory() as tmp:
+            BenchConfig.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+            app = create_app(BenchConfig)
+            with app.app_context():
+                db.create_all()
+                results[name] = bench(AmenityRepository(), count)
+                db.session.remove()
+                db.engine.dispose()
+    return results
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    print(f"{'rows':>8} {'add (s)':>10} {'add_many (s)':>13} {'speedup':>8}")
+    for count in sizes:
+        results = run(count)
+        speedup = results['add'] / results['add_many']
+        print(f"{count:>8} {results['add']:>10.2f} {results['add_many']:>13.2f} {speedup:>7.1f}x")
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+"""
+Compare flask_restx's stdlib JSON output with app.api.representations on the
+payloads GET /places/ really returns: rows shaped by facade.expand_places, so
+timestamps are already isoformat() strings, for the default fields and for
+?fields=...,created_at,updated_at&include=owner,amenities
+
+Usage: python -m benchmarks.bench_json [places ...]   (default: 10000)
+"""
+import json
+import sys
+import time
+
+from sqlalchemy import insert
+
+from app import create_app, db
+from app.api import representations
+from app.api.v1.places import PLACE_LIST_COLUMNS
+from app.models.amenity import Amenity
+from app.models.place import Place, place_amenity
+from app.models.user import User
+from app.services import facade
+
+ROUNDS = 20
+PAYLOADS = {
+    'default': (list(PLACE_LIST_COLUMNS), []),
+    'include': (list(PLACE_LIST_COLUMNS) + ['created_at', 'updated_at'], ['owner', 'amenities']),
+}
+
+
+class BenchConfig:
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+
+def make_places(count):
+    """count places of one owner, each with two of five amenities"""
+    owner = User(first_name="Bench", last_name="Owner", email="bench@example.com")
+    owner.hash_password("bench")
+    amenities = [Amenity(name=f"Amenity {i}") for i in range(5)]
+    db.session.add_all([owner, *amenities])
+    db.session.commit()
+    places = [Place(title=f"Place {i}", description="A nice place", price=50 + i % 200,
+                    latitude=48.85 + i / 10000, longitude=2.35 - i / 10000, owner=owner) for i in range(count)]
+    facade.place_repo.add_many(places)
+    db.session.execute(insert(place_amenity), [{'place_id': place.id, 'amenity_id': amenities[(i + k) % 5].id}
+                                               for i, place in enumerate(places) for k in (0, 1)])
+    db.session.commit()
+
+
+def payload(count, fields, include):
+    """The body of one GET /places/?limit=count page, as the view builds it"""
+    rows, _ = facade.get_places_page(count, columns=facade.place_columns(fields, include))
+    return facade.expand_places(rows, fields, include)[0]
+
+
+def bench_stdlib(items):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        json.dumps(items) + "\n"
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def bench_representation(items):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        representations.dumps(items)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000]
+    encoder = 'orjson' if representations.orjson is not None else 'json (orjson not installed)'
+    print(f"representation encoder: {encoder}")
+    print(f"{'places':>8} {'payload':>8} {'stdlib (ms)':>12} {'representation (ms)':>20} {'speedup':>8}")
+    for count in sizes:
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            make_places(count)
+            for name, (fields, include) in PAYLOADS.items():
+                items = payload(count, fields, include)
+                stdlib = bench_stdlib(items)
+                fast = bench_representation(items)
+                print(f"{count:>8} {name:>8} {stdlib * 1000:>12.1f} {fast * 1000:>20.1f} {stdlib / fast:>7.1f}x")
+            db.session.remove()
@@ -3,13 +3,38 @@ import os
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'default_secret_key')
     DEBUG = False
+    # Public GET responses: 'local' (per worker), 'sqlite' (shared file) or None to disable
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'local')
+    RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', 'response_cache.db')
+    RESPONSE_CACHE_SIZE = 1024
+    # Tag versions kept by the local backend, per-id tags ('place:<id>') included
+    RESPONSE_CACHE_TAGS = 8192
+    RESPONSE_CACHE_TTL = 60
+    # Per-worker cache in front of repository get() by id: TTL in seconds, unset disables it
+    REPOSITORY_CACHE_SIZE = int(os.getenv('REPOSITORY_CACHE_SIZE', 4096))
+    REPOSITORY_CACHE_TTL = float(os.getenv('REPOSITORY_CACHE_TTL', 0)) or None
+    # Response compression: gzip level 1-9 (0 disables it), brotli quality 0-11 when installed,
+    # bodies under COMPRESS_MIN_SIZE bytes are not worth it
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
+    COMPRESS_MIN_SIZE = 500
 
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///development.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+class TestingConfig(Config):
+    TESTING = True
+    # Relationships not eager-loaded by the facade raise instead of lazy loading
+    SQLALCHEMY_RAISELOAD = True
+    RESPONSE_CACHE_BACKEND = None
+    REPOSITORY_CACHE_TTL = None
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
 config = {
     'development': DevelopmentConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
@@ -0,0 +1,30 @@
+#!/usr/bin/python3
+"""
+Background job: bring places.review_count / rating_sum / rating_avg back in line with the reviews
+
+Usage: python reconcile_ratings.py [config] [--every SECONDS]   (default: one pass)
+"""
+import sys
+import time
+
+from app import create_app
+from app.services import facade
+
+
+def main(argv):
+    args = [arg for arg in argv if not arg.startswith('--')]
+    interval = float(argv[argv.index('--every') + 1]) if '--every' in argv else None
+    if interval is not None:
+        args.remove(argv[argv.index('--every') + 1])
+    app = create_app(args[0] if args else "config.DevelopmentConfig")
+    while True:
+        with app.app_context():
+            fixed = facade.reconcile_ratings()
+        print(f"Reconciled {fixed} place(s)")
+        if interval is None:
+            return
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
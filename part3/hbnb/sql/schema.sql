@@ -46,3 +46,8 @@ CREATE TABLE place_amenity (
     FOREIGN KEY (place_id) REFERENCES places(id),
     FOREIGN KEY (amenity_id) REFERENCES amenities(id)
 );
+
+-- Secondary indexes: foreign keys and the reverse direction of the association table
+CREATE INDEX ix_places_owner_id ON places(owner_id);
+CREATE INDEX ix_reviews_place_id ON reviews(place_id);
+CREATE INDEX ix_place_amenity_amenity_place ON place_amenity(amenity_id, place_id);